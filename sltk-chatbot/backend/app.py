@@ -4,13 +4,36 @@ Real-time monitoring for SLTK upload groups
 """
 
 import os
+import io
+import csv
 import sys
 import time
+import shutil
+import tempfile
+import uuid
+import json
+import base64
+import zipfile
+import hashlib
+import stat
+import bisect
+import socket
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
+import socketio as python_socketio
 import threading
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import fcntl  # POSIX record locks for multi-worker monitor leadership
+except ImportError:
+    fcntl = None
 
 # Check if pandas is available (optional - for Excel processing)
 PANDAS_AVAILABLE = False
@@ -22,12 +45,16 @@ except ImportError as e:
     print(f"⚠️  WARNING: pandas not available: {e}")
     print("   Excel upload feature will be limited")
     print("   To install: yum install python313-pandas")
-    # Try openpyxl as fallback
-    try:
-        from openpyxl import load_workbook, Workbook
-        print("✅ Using openpyxl as fallback for Excel processing")
-    except ImportError:
-        print("⚠️  openpyxl also not available")
+
+# Check if openpyxl is available (optional - for streaming Excel processing)
+OPENPYXL_AVAILABLE = False
+try:
+    from openpyxl import load_workbook, Workbook
+    OPENPYXL_AVAILABLE = True
+    print("✅ SUCCESS: openpyxl imported successfully")
+except ImportError as e:
+    print(f"⚠️  WARNING: openpyxl not available: {e}")
+    print("   Uploaded files will be saved without the timestamp column")
 
 # Check if pyodbc is available for DB2 access (optional - for database features)
 PYODBC_AVAILABLE = False
@@ -36,6 +63,7 @@ try:
     PYODBC_AVAILABLE = True
     print("✅ SUCCESS: pyodbc imported successfully")
 except ImportError as e:
+    pyodbc = None
     print(f"⚠️  WARNING: pyodbc not available: {e}")
     print("   Database features will be disabled")
     print("   To install: yum install python313-pyodbc")
@@ -47,94 +75,988 @@ DROPBOX_FOLDER_POC = '/HOME/VIJAYVERMA'  # POC folder (fallback)
 SLTK_LIBRARY = 'ASHLEY'  # SLTK library
 HOST_IP = '0.0.0.0'  # Network access
 PORT = 44001  # IBM i API port
-POLL_INTERVAL = 2  # Poll every 2 seconds
+# Socket.IO server mode: 'threading' for the development server (python app.py),
+# 'gevent' for the production entry point (python serve.py)
+ASYNC_MODE = os.environ.get('SLTK_ASYNC_MODE', 'threading')
+WORKERS = int(os.environ.get('SLTK_WORKERS', '1'))  # Worker processes started by serve.py
+SHARED_STATE_DIR = os.path.join(tempfile.gettempdir(), 'sltk-shared')  # Monitor leader locks/snapshots and upload jobs shared by workers (private, mode 0700)
+MESSAGE_BROKER_SOCKET = os.path.join(SHARED_STATE_DIR, 'broker.sock')  # Unix socket (mode 0600) of the serve.py message broker linking worker processes
+MONITOR_LEADER_RETRY = 5  # Seconds between attempts to take over a group polled by another worker
+MONITOR_STATE_RETENTION = 3600  # Seconds a group's leader lock and snapshot files are kept after its last poll
+POLL_INTERVAL = 2  # Initial poll interval for a newly monitored group (seconds)
+MIN_POLL_INTERVAL = 1  # Poll interval while a group's progress is moving (seconds)
+MAX_POLL_INTERVAL = 30  # Longest back-off for idle or waiting groups (seconds)
+POLL_BACKOFF_FACTOR = 2  # Interval multiplier for each poll without progress
+WAITING_STATUSES = ('P', 'R')  # Group statuses polled at the backed-off rate
+STATUS_DELTA_UPDATES = True  # Send 'status-delta' with changed fields after the first full update
+MAX_ACTIVE_MONITORS = 500  # Max groups monitored at once
+MONITOR_IDLE_GRACE = 60  # Seconds a monitor without subscribers is kept (not polled) before removal
+LOAD_CATALOG_REFRESH_INTERVAL = 300  # Seconds the /api/loads catalog is served from memory
+DROPBOX_SCAN_INTERVAL = 10  # Seconds between background rescans of the dropbox folders
+SQL_IN_CHUNK_SIZE = 200  # Max group IDs per IN (...) predicate
+STATUS_BATCH_MAX_GROUPS = 200  # Max groups per /api/status?ids= request or 'monitor-many' event
+DB_POOL_MAX_SIZE = 10  # Max open DB2 connections
+DB_POOL_IDLE_TIMEOUT = 300  # Close connections idle longer than this (seconds)
+DB_POOL_VALIDATE_INTERVAL = 30  # Validate connections idle longer than this before reuse (seconds)
+DB_POOL_CHECKOUT_TIMEOUT = 5  # Max wait for a free connection (seconds)
+DB_STREAM_MAX_CONNECTIONS = 3  # Pooled connections NDJSON/export streams may hold at once (the rest stay free for short queries)
+DB_CONNECT_TIMEOUT = 10  # Login timeout when opening a DB2 connection (seconds)
+DB_QUERY_TIMEOUT = 15  # Seconds a DB2 statement may run before the driver cancels it (0 = no limit)
+DB_QUERY_TIMEOUTS = {'history_export': 300, 'errors_stream': 300}  # Per query name overrides of DB_QUERY_TIMEOUT
+DB_BREAKER_THRESHOLD = 5  # Consecutive DB2 connection/timeout failures that open the circuit breaker
+DB_BREAKER_PROBE_INTERVAL = 10  # Seconds between background recovery probes while the circuit is open
+STALE_FALLBACK = True  # Serve the last good /api/status, /api/loads and /api/history result (marked stale) while DB2 is unavailable
+STALE_MAX_AGE = 3600  # Oldest result served as stale (seconds)
+STALE_HISTORY_CACHE_SIZE = 200  # /api/history pages kept for the stale fallback
+DB_BLOCKING_THREADS = DB_POOL_MAX_SIZE  # Native threads running pyodbc calls in gevent mode
+STATUS_CACHE_TTL = 2  # Seconds a cached group status stays fresh
+STATUS_CACHE_FINISHED_TTL = 300  # Seconds for groups in a final status (X/E/C)
+STATUS_CACHE_MAX_SIZE = 1000  # Max cached groups (least recently used evicted)
+FINISHED_STATUSES = ('X', 'E', 'C')  # Group statuses that no longer change
+# Change-stamp columns (date, time) of SLTKTRN. The latest stamp of a group is read
+# with one probe of an index over (ZTGPID, date, time) before the progress
+# aggregation, so idle groups skip it
+TRN_CHANGE_COLUMNS = ('ZTCHDT', 'ZTCHTM')
+EXCEL_PROCESSING_MODE = 'streaming'  # 'streaming' (openpyxl row pass), 'pandas' or 'raw'
+UPLOAD_STAGING_DIR = os.path.join(tempfile.gettempdir(), 'sltk-upload')  # Spool area for incoming files
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read per chunk when spooling uploads
+TIMESTAMP_COLUMN = 'IBMi_Process_Timestamp'  # Column added to every uploaded sheet
+ASYNC_UPLOADS = True  # Accept uploads immediately and process them in worker processes
+UPLOAD_WORKERS = 2  # Worker processes for spreadsheet processing
+UPLOAD_QUEUE_DEPTH = 20  # Max uploads waiting for a worker before new ones are refused
+UPLOAD_JOB_RETENTION = 3600  # Seconds finished upload jobs stay queryable
+UPLOAD_SESSION_RETENTION = 24 * 3600  # Seconds an unfinished chunked upload can be resumed
+UPLOAD_DEDUPLICATION = True  # Skip files identical (SHA-256) to one already dropped for the same load
+UPLOAD_HASH_RETENTION = 7 * 24 * 3600  # Seconds a dropped file's hash blocks identical uploads
+PREFLIGHT_VALIDATION = True  # Check worksheets against SLTKSNU before a file is dropped (form field validate=false skips)
+SLTKSNU_LOAD_COLUMN = 'Z8LOAD'  # SLTKSNU column holding the load ID
+SLTKSNU_SHEET_COLUMN = 'Z8WKSH'  # SLTKSNU column holding the worksheet name SLTKDRP reads
+PREFLIGHT_SAMPLE_ROWS = 10  # Rows read per worksheet to find a header and a data row
+BULK_UPLOAD_MAX_FILES = 50  # Max workbooks per /upload/bulk request (including zip members)
+BULK_UPLOAD_MAX_BYTES = 500 * 1024 * 1024  # Max total (uncompressed) size of one /upload/bulk request
+BULK_UPLOAD_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')  # Zip members with other extensions are skipped
+UPLOAD_HASH_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload_hashes')  # One JSON index per dropbox folder
+HISTORY_DEFAULT_PAGE_SIZE = 50  # /api/history rows per page when no limit is given
+HISTORY_MAX_PAGE_SIZE = 500  # Upper bound for /api/history limit
+ERRORS_MAX_PAGE_SIZE = 1000  # Upper bound for /api/errors limit (failed transactions per page)
+ERROR_EVENTS = True  # Emit error-added events with newly failed transactions while a group is monitored
+ERROR_EVENT_MAX_ERRORS = 200  # Max failed transactions per error-added event; the rest follow on the next polls
+ERROR_SUMMARY_SAMPLES = 3  # Sample failed transactions per message ID in /api/errors/<groupId>/summary
+# Optional JSON file {"<messageId>": {"issue": ..., "fix": ..., "sql": ...}} merged over the built-in error catalog
+ERROR_CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'error_catalog.json')
+QUERY_FETCH_BATCH_SIZE = 500  # Rows per fetchmany() when streaming query results
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'sltk-export')  # Scratch files for XLSX exports (removed once sent)
+STATEMENT_CACHE_SIZE = 32  # Prepared cursors kept per pooled connection (least recently used closed)
 
 # --- Initialize Flask App ---
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'sltk-secret-key-change-in-production'
 CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO()
+
+class LocalBrokerManager(python_socketio.PubSubManager):
+    """
+    Socket.IO client manager linking the worker processes of one host
+
+    Room emits, room membership changes and disconnects are published as
+    JSON lines to the message broker run by serve.py, which relays them to
+    every worker, so a status update emitted by the worker polling a group
+    reaches clients connected to any worker. url is 'sltk://<socket path>';
+    the broker listens on a Unix socket only the service user can open.
+    Received lines are decoded here and handed on as dicts, so nothing from
+    the broker ever reaches a pickle based decoder.
+    """
+
+    name = 'sltk-broker'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = url.split('://', 1)[1]
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _publish(self, data):
+        line = (json.dumps(data) + '\n').encode('utf-8')
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect()
+                    self._publisher.sendall(line)
+                    return
+                except OSError as e:
+                    self._publisher = None
+                    if attempt:
+                        print(f"ERROR: Cannot publish to message broker {self.address}: {e}")
+
+    def _listen(self):
+        while True:
+            try:
+                with self._connect() as sock:
+                    sock.sendall(b'SUB\n')
+                    for line in sock.makefile('rb'):
+                        try:
+                            message = json.loads(line)
+                        except ValueError:
+                            print("WARNING: Ignoring malformed message broker line")
+                            continue
+                        if isinstance(message, dict):
+                            yield message
+                print("WARNING: Message broker closed the connection - reconnecting")
+            except OSError as e:
+                print(f"WARNING: Message broker unavailable ({e}) - retrying")
+            socketio.sleep(1)
+
+def create_app(message_queue=None):
+    """
+    Attach Socket.IO to the Flask app and return the app
+
+    message_queue links several worker processes: 'sltk://<socket path>'
+    for the broker started by serve.py, or any URL Flask-SocketIO supports
+    (redis://, amqp://, ...). None serves a single process.
+    """
+    if socketio.server is None:
+        options = {'cors_allowed_origins': "*", 'async_mode': ASYNC_MODE}
+        if message_queue and message_queue.startswith('sltk://'):
+            options['client_manager'] = LocalBrokerManager(message_queue)
+        elif message_queue:
+            options['message_queue'] = message_queue
+        if message_queue:
+            # Long-polling needs sticky sessions, which a shared listener cannot give
+            options['transports'] = ['websocket']
+        socketio.init_app(app, **options)
+    return app
+
+# --- Metrics ---
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2, 256 * 1024 ** 2)
+
+metrics_registry = []
+
+def format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+class Counter:
+    """Monotonic counter, optionally split by labels (Prometheus text format)"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {} if label_names else {(): 0}
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values):
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+class Gauge:
+    """Gauge read from a callback at scrape time; the callback may return {labels: value}"""
+
+    def __init__(self, name, help_text, read, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.label_names = label_names
+        metrics_registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        value = self.read()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for label_values, v in sorted(values):
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {v}")
+        return lines
+
+class Histogram:
+    """Bucketed histogram, optionally split by labels (Prometheus text format)"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in sorted(series_items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                labels = format_labels(self.label_names, label_values, [('le', bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+def render_metrics():
+    """All registered metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in metrics_registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"ERROR: Cannot render metric {metric.name}: {e}")
+    return '\n'.join(lines) + '\n'
+
+DB_QUERY_SECONDS = Histogram('sltk_db_query_duration_seconds', 'DB2 query latency by query name', label_names=('query',))
+DB_ERRORS = Counter('sltk_db_errors_total', 'Failed DB2 queries by query name', ('query',))
+DB_CONNECTIONS_OPENED = Counter('sltk_db_connections_opened_total', 'DB2 connections opened by the pool')
+DB_RECONNECTS = Counter('sltk_db_reconnects_total', 'Pooled DB2 connections replaced after failing validation')
+DB_POOL_TIMEOUTS = Counter('sltk_db_pool_timeouts_total', 'Checkouts that gave up waiting for a pooled connection')
+DB_CIRCUIT_OPENED = Counter('sltk_db_circuit_opened_total', 'Times the DB2 circuit breaker opened')
+DB_CIRCUIT_REJECTED = Counter('sltk_db_circuit_rejected_total', 'DB2 calls failed fast while the circuit breaker was open')
+STALE_RESPONSES = Counter('sltk_stale_responses_total', 'Responses served from the last good result by endpoint', ('endpoint',))
+SOCKETIO_EVENTS = Counter('sltk_socketio_events_emitted_total', 'Socket.IO events emitted by event name', ('event',))
+UPLOAD_BYTES = Histogram('sltk_upload_size_bytes', 'Size of uploaded workbooks', buckets=SIZE_BUCKETS)
+UPLOAD_SECONDS = Histogram('sltk_upload_processing_duration_seconds', 'Upload processing time by mode', label_names=('mode',))
+UPLOADS = Counter('sltk_uploads_total', 'Processed uploads by result', ('result',))
+UPLOAD_POOL_RESTARTS = Counter('sltk_upload_pool_restarts_total', 'Upload process pools replaced after a worker process died')
+Gauge('sltk_monitor_scheduler_threads', 'Running monitor scheduler threads',
+      lambda: 0 if monitor_scheduler_thread is None else 1)
+Gauge('sltk_monitored_groups', 'Groups in the monitor schedule', lambda: len(active_monitors))
+Gauge('sltk_subscribed_rooms', 'Monitored groups with at least one subscriber',
+      lambda: sum(1 for m in list(active_monitors.values()) if m.subscribers))
+Gauge('sltk_socketio_clients', 'Connected Socket.IO clients', lambda: len(connected_clients))
+Gauge('sltk_db_pool_connections', 'Pooled DB2 connections by state',
+      lambda: {('idle',): db_pool.stats()['idle'], ('in_use',): db_pool.stats()['inUse']}, ('state',))
+Gauge('sltk_upload_queue_depth', 'Uploads waiting for a worker', lambda: upload_queue.qsize())
+Gauge('sltk_db_circuit_open', '1 while the DB2 circuit breaker is open', lambda: 1 if db_breaker.is_open else 0)
+
+def socket_emit(event, data, room=None):
+    """
+    Emit a Socket.IO event and count it
+
+    With a room the event is broadcast to that room; without one it is a
+    reply to the client of the current Socket.IO handler.
+    """
+    SOCKETIO_EVENTS.inc(1, event)
+    if room is None:
+        emit(event, data)
+    else:
+        socketio.emit(event, data, room=room)
+
+@contextmanager
+def timed_query(name):
+    """Record latency (and failure) of the DB work in the block under name"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_ERRORS.inc(1, name)
+        raise
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, name)
 
 # --- Database Connection ---
-db_connection = None
-active_monitors = {}  # groupId -> thread
+active_monitors = {}  # groupId -> GroupMonitor
+monitors_lock = threading.Lock()
+monitor_scheduler_thread = None
+monitor_wakeup = threading.Event()
+client_monitors = {}  # Socket.IO sid -> set of monitored groupIds
+connected_clients = set()  # Socket.IO sids
 
 def get_db_connection():
-    """Get IBM i DB2 connection"""
-    global db_connection
-
+    """Open a new IBM i DB2 connection (used by the connection pool)"""
     if not PYODBC_AVAILABLE:
         raise RuntimeError("pyodbc is not available - database features are disabled")
 
-    if db_connection is None:
+    try:
+        # IBM i ODBC connection string
+        connection_string = (
+            "DRIVER={IBM i Access ODBC Driver};"
+            "SYSTEM=localhost;"  # Change if needed
+            "DATABASE=ASHLEY;"
+            "UID=VIJAYVERMA;"  # Change to your user
+            "PWD=COSTARIC1;"  # Change to your password
+        )
+        conn = pyodbc.connect(connection_string, timeout=DB_CONNECT_TIMEOUT)
+        conn.timeout = DB_QUERY_TIMEOUT  # Applies to cursors created from now on
+        print("✅ SUCCESS: Database connection established")
+        return conn
+    except Exception as e:
+        print(f"❌ ERROR: Database connection failed: {e}")
+        raise
+
+# pyodbc calls would hold the whole event loop under gevent, so in that
+# mode they run on a bounded pool of native threads instead
+blocking_pool = None
+if ASYNC_MODE == 'gevent':
+    from gevent.threadpool import ThreadPool
+    blocking_pool = ThreadPool(DB_BLOCKING_THREADS)
+
+def run_blocking(func, *args):
+    """
+    Call a blocking function (pyodbc connect/execute/fetch, spreadsheet work)
+
+    In gevent mode the call runs on one of DB_BLOCKING_THREADS native
+    threads while the calling greenlet yields, so other clients keep being
+    served; in threading mode it is called directly.
+    """
+    if blocking_pool is not None:
+        return blocking_pool.apply(func, args)
+    return func(*args)
+
+class DatabaseUnavailableError(RuntimeError):
+    """DB2 could not be reached or did not answer in time"""
+
+class PoolTimeoutError(DatabaseUnavailableError):
+    """Raised when no pooled connection becomes available in time"""
+
+class CircuitOpenError(DatabaseUnavailableError):
+    """Raised instead of touching DB2 while the circuit breaker is open"""
+
+# Errors caused by the statement itself - the database did answer
+DB_STATEMENT_ERRORS = (
+    (pyodbc.ProgrammingError, pyodbc.IntegrityError, pyodbc.DataError, pyodbc.NotSupportedError)
+    if pyodbc is not None else ()
+)
+# Other driver and network errors mean DB2 could not be reached or timed out
+DB_OUTAGE_ERRORS = (pyodbc.Error, OSError) if pyodbc is not None else (OSError,)
+
+def query_timeout(name):
+    """Statement timeout (seconds) for the query recorded under name"""
+    return DB_QUERY_TIMEOUTS.get(name, DB_QUERY_TIMEOUT)
+
+class DB2ConnectionPool:
+    """
+    Bounded, thread-safe pool of IBM i DB2 connections
+
+    Connections are opened lazily up to max_size. A connection that sat
+    idle longer than validate_interval is checked with a cheap query before
+    it is handed out, and replaced if the check fails; connections idle
+    longer than idle_timeout are closed. A connection that raised during use
+    is validated before it goes back into the pool.
+    """
+
+    VALIDATION_SQL = "SELECT 1 FROM SYSIBM.SYSDUMMY1"
+
+    def __init__(self, connect, max_size, idle_timeout, validate_interval, checkout_timeout, validate_timeout=None):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.validate_interval = validate_interval
+        self.checkout_timeout = checkout_timeout
+        self.validate_timeout = validate_timeout  # Query timeout of the validation statement
+        self._idle = []  # (connection, last_used) - most recently used last
+        self._size = 0  # open connections, idle and checked out
+        self._cond = threading.Condition()
+        self._statements = {}  # connection -> OrderedDict(sql -> cursor)
+
+    def acquire(self):
+        """Borrow a healthy connection, opening or reconnecting as needed"""
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                expired = self._evict_idle_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    DB_POOL_TIMEOUTS.inc()
+                    raise PoolTimeoutError(
+                        f"No database connection available within {self.checkout_timeout}s "
+                        f"(pool size {self.max_size})"
+                    )
+                self._cond.wait(remaining)
+        self._close_all(expired)
+
+        if conn is not None:
+            if time.monotonic() - last_used < self.validate_interval or self._validate(conn):
+                return conn
+            print("WARNING: Pooled database connection failed validation - reconnecting")
+            DB_RECONNECTS.inc()
+            self._close_all([conn])
+
+        # Slot is reserved; open a fresh connection for it
         try:
-            # IBM i ODBC connection string
-            connection_string = (
-                "DRIVER={IBM i Access ODBC Driver};"
-                "SYSTEM=localhost;"  # Change if needed
-                "DATABASE=ASHLEY;"
-                "UID=VIJAYVERMA;"  # Change to your user
-                "PWD=COSTARIC1;"  # Change to your password
-            )
-            db_connection = pyodbc.connect(connection_string)
-            print("✅ SUCCESS: Database connection established")
-        except Exception as e:
-            print(f"❌ ERROR: Database connection failed: {e}")
+            conn = run_blocking(self._connect)
+            DB_CONNECTIONS_OPENED.inc()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, validate=False):
+        """Return a borrowed connection; drop it if validation fails"""
+        if validate and not self._validate(conn):
+            print("WARNING: Dropping broken database connection from pool")
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            expired = self._evict_idle_locked()
+            self._cond.notify()
+        self._close_all(expired)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection for the block"""
+        conn = self.acquire()
+        failed = False
+        try:
+            yield conn
+        except Exception:
+            failed = True
             raise
-    return db_connection
+        finally:
+            # Also runs when a streaming generator is closed early
+            self.release(conn, validate=failed)
+
+    def ping(self):
+        """
+        Borrow a connection that answers the validation query, or raise
+
+        Broken idle connections met on the way are dropped, so a successful
+        ping also clears connections left over from before an outage.
+        """
+        while True:
+            conn = self.acquire()
+            if self._validate(conn):
+                self.release(conn)
+                return
+            self._discard(conn)
+
+    def statement_cursor(self, conn, sql, timeout=None):
+        """
+        (cursor, prepared_sql) of conn dedicated to sql
+
+        pyodbc keeps a cursor's prepared statement only while it is executed
+        with the very same string object it was prepared from (an identity
+        check, not a comparison), and queries here are built afresh on every
+        call. So each connection keeps up to STATEMENT_CACHE_SIZE cursors
+        keyed by statement text and timeout, together with the first string
+        object seen for that text; execute with prepared_sql, not sql, to
+        skip the prepare. pyodbc applies the connection's query timeout to
+        a cursor when it is created. Only the borrower of conn touches its
+        cache.
+        """
+        key = (sql, timeout)
+        cursors = self._statements.setdefault(conn, OrderedDict())
+        statement = cursors.get(key)
+        if statement is not None:
+            cursors.move_to_end(key)
+            return statement
+        statement = cursors[key] = (self._cursor(conn, timeout), sql)
+        if len(cursors) > STATEMENT_CACHE_SIZE:
+            _, (evicted, _) = cursors.popitem(last=False)
+            self._close_cursor(evicted)
+        return statement
+
+    def discard_cursor(self, conn, sql, timeout=None):
+        """Close a cached cursor left in an unknown state (error, unread rows)"""
+        statement = self._statements.get(conn, {}).pop((sql, timeout), None)
+        if statement is not None:
+            self._close_cursor(statement[0])
+
+    def close_all(self):
+        """Close every idle connection (checked-out ones close on return)"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self):
+        """Current pool occupancy"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'inUse': self._size - len(self._idle),
+                'maxSize': self.max_size
+            }
+
+    def _evict_idle_locked(self):
+        """Remove connections idle past idle_timeout; caller closes them"""
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [conn for conn, last_used in self._idle if last_used < cutoff]
+        if expired:
+            self._idle = [(conn, last_used) for conn, last_used in self._idle if last_used >= cutoff]
+            self._size -= len(expired)
+        return expired
+
+    def _discard(self, conn):
+        """Close a borrowed connection and free its slot"""
+        self._close_all([conn])
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _validate(self, conn):
+        return run_blocking(self._check, conn)
+
+    @staticmethod
+    def _cursor(conn, timeout=None):
+        """New cursor of conn with timeout; the connection's own timeout is left as it was"""
+        if timeout is None:
+            return conn.cursor()
+        default = conn.timeout
+        conn.timeout = timeout
+        try:
+            return conn.cursor()
+        finally:
+            conn.timeout = default
+
+    def _check(self, conn):
+        try:
+            cursor = self._cursor(conn, self.validate_timeout)
+            try:
+                cursor.execute(self.VALIDATION_SQL)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"WARNING: Database connection validation failed: {e}")
+            return False
+
+    def _close_all(self, connections):
+        for conn in connections:
+            self._statements.pop(conn, None)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _close_cursor(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+db_pool = DB2ConnectionPool(
+    connect=lambda: get_db_connection(),
+    max_size=DB_POOL_MAX_SIZE,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    validate_interval=DB_POOL_VALIDATE_INTERVAL,
+    checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT,
+    validate_timeout=DB_CONNECT_TIMEOUT
+)
+# Streams hold their connection for up to DB_QUERY_TIMEOUTS seconds, so only
+# a few may run at once - a burst of exports must not drain the pool
+stream_slots = threading.BoundedSemaphore(DB_STREAM_MAX_CONNECTIONS)
+
+class CircuitBreaker:
+    """
+    Fail fast while DB2 is unreachable
+
+    After threshold consecutive failures (connection errors, query
+    timeouts) the circuit opens: DB calls raise CircuitOpenError at once
+    instead of each waiting out a login or query timeout. While it is open
+    a background task calls probe() every probe_interval seconds and closes
+    the circuit on the first success.
+    """
+
+    def __init__(self, probe, threshold, probe_interval):
+        self._probe = probe
+        self.threshold = threshold
+        self.probe_interval = probe_interval
+        self._failures = 0  # consecutive failures
+        self._opened_at = None  # time.time() the circuit opened, None while closed
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
 
-def query_db(sql, params=None):
-    """Execute SQL query and return results"""
+    def check(self):
+        """Raise CircuitOpenError while the circuit is open"""
+        opened_at = self._opened_at
+        if opened_at is not None:
+            DB_CIRCUIT_REJECTED.inc()
+            raise CircuitOpenError(
+                f"Database unavailable since {datetime.fromtimestamp(opened_at).isoformat()} "
+                f"({self._last_error}) - retrying every {self.probe_interval}s"
+            )
+
+    def record_success(self):
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            if self._opened_at is not None or self._failures < self.threshold:
+                return
+            self._opened_at = time.time()
+        DB_CIRCUIT_OPENED.inc()
+        print(f"❌ ERROR: Database circuit opened after {self._failures} consecutive failures: {error}")
+        socketio.start_background_task(self._run_probes)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'circuit': 'open' if self._opened_at is not None else 'closed',
+                'openedAt': datetime.fromtimestamp(self._opened_at).isoformat() if self._opened_at else None,
+                'consecutiveFailures': self._failures,
+                'lastError': str(self._last_error) if self._last_error else None
+            }
+
+    def _run_probes(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                self._probe()
+            except Exception as e:
+                print(f"WARNING: Database still unavailable: {e}")
+                with self._lock:
+                    self._last_error = e
+                continue
+            with self._lock:
+                self._opened_at = None
+                self._failures = 0
+            print("✅ SUCCESS: Database reachable again - circuit closed")
+            return
+
+db_breaker = CircuitBreaker(
+    probe=lambda: db_pool.ping(),
+    threshold=DB_BREAKER_THRESHOLD,
+    probe_interval=DB_BREAKER_PROBE_INTERVAL
+)
+
+@contextmanager
+def db_statement(sql, timeout=None):
+    """
+    Borrow a pooled connection and yield (cursor, prepared_sql) for sql
+
+    Execute prepared_sql - the string object the cached cursor was prepared
+    from - so pyodbc reuses the prepared statement.
+
+    Raises CircuitOpenError without touching DB2 while the circuit breaker
+    is open. Connection errors and timeouts (DB_OUTAGE_ERRORS) are raised
+    as DatabaseUnavailableError and counted by the breaker. A pool checkout
+    timeout is raised as PoolTimeoutError but not counted - a busy pool says
+    nothing about DB2's health. Errors caused by the statement itself and
+    other exceptions raised in the block are raised unchanged.
+    """
+    db_breaker.check()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(sql, params)
-        else:
-            cursor.execute(sql)
-        
-        # Get column names
-        columns = [column[0] for column in cursor.description]
-        
-        # Fetch all rows
-        rows = cursor.fetchall()
-        
-        # Convert to list of dicts
-        results = []
-        for row in rows:
-            results.append(dict(zip(columns, row)))
-        
-        cursor.close()
-        return results
+        with db_pool.connection() as conn:
+            statement = db_pool.statement_cursor(conn, sql, timeout)
+            completed = False
+            try:
+                yield statement
+                completed = True
+            finally:
+                if not completed:
+                    db_pool.discard_cursor(conn, sql, timeout)
+    except DB_STATEMENT_ERRORS:
+        db_breaker.record_success()  # The database answered
+        raise
+    except PoolTimeoutError:
+        raise
+    except DatabaseUnavailableError as e:
+        db_breaker.record_failure(e)
+        raise
+    except DB_OUTAGE_ERRORS as e:
+        db_breaker.record_failure(e)
+        raise DatabaseUnavailableError(str(e)) from e
+    db_breaker.record_success()
+
+row_types = {}  # column names -> record class
+
+def row_type(columns):
+    """
+    Lightweight record class for result rows with the given column names
+
+    A namedtuple (no per-row dict) that also answers row['column'] and
+    row.get('column'); hot paths use attribute access.
+    """
+    row_class = row_types.get(columns)
+    if row_class is None:
+        base = namedtuple('Row', columns, rename=True)
+
+        class Row(base):
+            __slots__ = ()
+
+            def __getitem__(self, key):
+                if isinstance(key, str):
+                    return getattr(self, key)
+                return base.__getitem__(self, key)
+
+            def get(self, key, default=None):
+                return getattr(self, key, default)
+
+        row_class = row_types[columns] = Row
+    return row_class
+
+def row_reader(description):
+    """
+    Function turning cursor rows into Row records, CHAR columns trimmed
+
+    DB2 blank-pads fixed-width CHAR values; they are stripped here once so
+    callers don't. pyodbc reports str for character columns, drivers that
+    report no type have every value checked.
+    """
+    make = row_type(tuple(column[0] for column in description))._make
+    text = [i for i, column in enumerate(description) if column[1] in (str, None)]
+    if not text:
+        return make
+
+    def read(row):
+        values = list(row)
+        for i in text:
+            value = values[i]
+            if value.__class__ is str:
+                values[i] = value.strip()
+        return make(values)
+    return read
+
+def execute_statement(cursor, sql, params):
+    if params:
+        run_blocking(cursor.execute, sql, params)
+    else:
+        run_blocking(cursor.execute, sql)
+
+def query_db(sql, params=None, name='other'):
+    """
+    Execute SQL query and return Row records (latency recorded under name)
+
+    name also selects the statement timeout (DB_QUERY_TIMEOUTS). Keep the
+    sql text constant for a given query - parameters go in params - so the
+    pooled connection can reuse its prepared statement.
+    """
+    try:
+        with timed_query(name), db_statement(sql, query_timeout(name)) as (cursor, prepared_sql):
+            execute_statement(cursor, prepared_sql, params)
+            read = row_reader(cursor.description)
+            rows = run_blocking(cursor.fetchall)
+        return [read(row) for row in rows]
     except Exception as e:
         print(f"ERROR: Query failed: {e}")
         raise
 
+def iter_query(sql, params=None, batch_size=None, name='other'):
+    """
+    Execute SQL query and yield Row records, fetching in batches
+
+    The pooled connection is held until the generator is exhausted or
+    closed, and at most batch_size rows are in memory at a time; at most
+    DB_STREAM_MAX_CONNECTIONS iterations hold a connection at once. Latency
+    is recorded under name for the whole iteration.
+    """
+    batch_size = batch_size or QUERY_FETCH_BATCH_SIZE
+    if not stream_slots.acquire(timeout=DB_POOL_CHECKOUT_TIMEOUT):
+        DB_POOL_TIMEOUTS.inc()
+        raise PoolTimeoutError(
+            f"All {DB_STREAM_MAX_CONNECTIONS} streaming connections busy for {DB_POOL_CHECKOUT_TIMEOUT}s"
+        )
+    try:
+        with timed_query(name), db_statement(sql, query_timeout(name)) as (cursor, prepared_sql):
+            execute_statement(cursor, prepared_sql, params)
+            read = row_reader(cursor.description)
+
+            while True:
+                rows = run_blocking(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield read(row)
+    finally:
+        stream_slots.release()
+
+def fetch_first_rows(rows):
+    """Row limit rounded up to a power of two, so FETCH FIRST only takes a few values"""
+    return 1 << max(rows - 1, 0).bit_length()
+
 # --- SLTK Dropbox Helper Functions ---
 
 def get_available_loads():
     """
     Get list of available SLTK Load IDs from SLTKLOD table
+
+    Raises DatabaseUnavailableError when DB2 cannot be reached.
     """
+    if not PYODBC_AVAILABLE:
+        return []
     try:
-        cursor = get_db_connection().cursor()
         query = f"SELECT ZFLOAD, ZFLDTX FROM {SLTK_LIBRARY}.SLTKLOD WHERE ZFAVST = '0' ORDER BY ZFLOAD"
-        cursor.execute(query)
-
-        loads = []
-        for row in cursor.fetchall():
-            loads.append({
-                "load_id": row[0].strip(),
-                "description": row[1].strip()
-            })
-
-        cursor.close()
-        return loads
+        return [
+            {"load_id": row.ZFLOAD, "description": row.ZFLDTX}
+            for row in query_db(query, name='loads')
+        ]
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         print(f"ERROR: Failed to get loads: {e}")
         return []
 
-def get_dropbox_folder(load_id=None, filename=None):
+class DropboxIndex:
+    """
+    In-memory index of the dropbox folders under root
+
+    Maps upper-cased folder names to paths and tracks the files waiting in
+    each folder (hidden temp files excluded). A background thread rescans
+    every scan_interval seconds; the root is only re-listed when its mtime
+    changes and a folder only when its own mtime changes.
+    """
+
+    def __init__(self, root, scan_interval):
+        self.root = root
+        self.scan_interval = scan_interval
+        self._folders = {}  # NAME -> {'name', 'path', 'mtime', 'files'}
+        self._root_mtime = None
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._thread = None
+        self.last_scan = None
+
+    def start(self):
+        """Build the index now and keep it current from a background thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # The task sleeps before its first rescan
+            self._thread = socketio.start_background_task(self._run)
+        self.rescan()
+        print(f"INFO: Dropbox index started ({len(self._folders)} folders, rescan every {self.scan_interval}s)")
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.scan_interval)
+            try:
+                self.rescan()
+            except Exception as e:
+                print(f"ERROR: Dropbox rescan failed: {e}")
+
+    def rescan(self):
+        """Refresh folders and pending files that changed since the last scan"""
+        with self._scan_lock:
+            try:
+                root_mtime = os.stat(self.root).st_mtime
+            except OSError:
+                if self._folders:
+                    print(f"WARNING: Dropbox root not found: {self.root}")
+                with self._lock:
+                    self._folders = {}
+                    self._root_mtime = None
+                return
+
+            with self._lock:
+                folders = dict(self._folders)
+
+            if root_mtime != self._root_mtime:
+                names = [entry.name for entry in os.scandir(self.root) if entry.is_dir()]
+                folders = {
+                    name.upper(): folders.get(name.upper()) or {
+                        'name': name,
+                        'path': os.path.join(self.root, name),
+                        'mtime': None,
+                        'files': []
+                    }
+                    for name in names
+                }
+
+            for key, folder in list(folders.items()):
+                try:
+                    mtime = os.stat(folder['path']).st_mtime
+                    if mtime != folder['mtime']:
+                        files = sorted(entry.name for entry in os.scandir(folder['path'])
+                                       if entry.is_file() and not entry.name.startswith('.'))
+                        folders[key] = dict(folder, mtime=mtime, files=files)
+                except OSError:
+                    del folders[key]
+
+            with self._lock:
+                changed = set(folders) != set(self._folders)
+                self._folders = folders
+                self._root_mtime = root_mtime
+                self.last_scan = datetime.now().isoformat()
+
+        if changed:
+            load_catalog.invalidate()
+
+    def resolve(self, name):
+        """Dropbox path for a load ID / folder name, or None if unknown"""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            folder = self._folders.get(name.strip().upper())
+            return folder['path'] if folder else None
+
+    def add(self, name, path):
+        """Record a folder created outside the scanner"""
+        with self._lock:
+            self._folders[name.strip().upper()] = {'name': name, 'path': path, 'mtime': None, 'files': []}
+
+    def is_known(self, path):
+        with self._lock:
+            return any(folder['path'] == path for folder in self._folders.values())
+
+    def folders(self):
+        """Folder names, sorted"""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            return sorted(folder['name'] for folder in self._folders.values())
+
+    def backlog(self):
+        """Folders that still hold files SLTKDRP has not picked up"""
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            return [
+                {'folder': folder['name'], 'path': folder['path'], 'pendingFiles': len(folder['files']), 'files': folder['files']}
+                for folder in sorted(self._folders.values(), key=lambda f: f['name'])
+                if folder['files']
+            ]
+
+dropbox_index = DropboxIndex(DROPBOX_ROOT, DROPBOX_SCAN_INTERVAL)
+
+def get_dropbox_folder(load_id=None, filename=None, create=True):
     """
     Dynamically determine dropbox folder based on Load ID or filename
 
@@ -142,21 +1064,29 @@ def get_dropbox_folder(load_id=None, filename=None):
     1. If load_id provided, use /sltk/dropbox/{load_id}/
     2. If filename matches pattern {LOAD}_*.xlsx, extract load_id
     3. Fallback to POC folder
+
+    Existing folders are looked up in dropbox_index instead of the IFS.
+    With create=False a missing load folder is returned without creating it.
     """
     # Option 1: Load ID provided explicitly
     if load_id:
+        dropbox_path = dropbox_index.resolve(load_id)
+        if dropbox_path:
+            return dropbox_path
+
         dropbox_path = os.path.join(DROPBOX_ROOT, load_id.strip().upper())
-        if os.path.exists(dropbox_path):
+        if not create:
             return dropbox_path
-        else:
-            print(f"WARNING: Dropbox folder not found: {dropbox_path}")
-            # Try to create it
-            try:
-                os.makedirs(dropbox_path, exist_ok=True)
-                print(f"SUCCESS: Created dropbox folder: {dropbox_path}")
-                return dropbox_path
-            except Exception as e:
-                print(f"ERROR: Cannot create dropbox folder: {e}")
+        print(f"WARNING: Dropbox folder not found: {dropbox_path}")
+        # Try to create it
+        try:
+            os.makedirs(dropbox_path, exist_ok=True)
+            print(f"SUCCESS: Created dropbox folder: {dropbox_path}")
+            dropbox_index.add(load_id.strip().upper(), dropbox_path)
+            load_catalog.invalidate()
+            return dropbox_path
+        except Exception as e:
+            print(f"ERROR: Cannot create dropbox folder: {e}")
 
     # Option 2: Extract Load ID from filename pattern
     if filename:
@@ -164,8 +1094,8 @@ def get_dropbox_folder(load_id=None, filename=None):
         parts = filename.split('_')
         if len(parts) > 0:
             potential_load = parts[0].upper()
-            dropbox_path = os.path.join(DROPBOX_ROOT, potential_load)
-            if os.path.exists(dropbox_path):
+            dropbox_path = dropbox_index.resolve(potential_load)
+            if dropbox_path:
                 print(f"INFO: Detected Load ID '{potential_load}' from filename")
                 return dropbox_path
 
@@ -175,173 +1105,1888 @@ def get_dropbox_folder(load_id=None, filename=None):
 
 def scan_dropbox_folders():
     """
-    Scan IFS root dropbox folder and return list of available folders
+    Return list of available dropbox folders (from the dropbox index)
     """
     try:
-        if os.path.exists(DROPBOX_ROOT):
-            folders = [f for f in os.listdir(DROPBOX_ROOT)
-                      if os.path.isdir(os.path.join(DROPBOX_ROOT, f))]
-            return sorted(folders)
-        else:
-            print(f"WARNING: Dropbox root not found: {DROPBOX_ROOT}")
-            return []
+        return dropbox_index.folders()
     except Exception as e:
         print(f"ERROR: Cannot scan dropbox folders: {e}")
         return []
 
-# --- Helper Functions ---
-def get_status_text(status):
-    """Convert status code to human-readable text"""
-    status_map = {
-        'P': 'Preparing',
-        'R': 'Ready',
-        'O': 'Processing',
-        'X': 'Success',
-        'E': 'Error',
-        'C': 'Cancelled',
-        'V': 'Validation Error'
-    }
-    return status_map.get(status.strip(), 'Unknown')
+def fetch_load_catalog(fallback=True):
+    """
+    Loads from SLTKLOD, or the dropbox folders when the table gives nothing
 
-def get_group_status(group_id):
-    """Get current status of a SLTK group"""
+    With fallback=False an unreachable database raises
+    DatabaseUnavailableError instead, so the caller can keep what it has.
+    """
+    # Try to get from SLTKLOD table
     try:
-        # Get group information
-        group_query = f"""
-            SELECT 
-                ZGGPID as groupId,
-                ZGGPDS as description,
-                ZGGPST as status,
-                ZGCHDT as changeDate,
-                ZGCHTM as changeTime,
-                ZGUSER as user
-            FROM {SLTK_LIBRARY}.SLTKGRP
-            WHERE ZGGPID = ?
-        """
-        
-        group_result = query_db(group_query, [group_id])
-        
-        if not group_result:
-            return None
-        
-        group = group_result[0]
-        
-        # Get transaction counts
-        progress_query = f"""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN ZTSYST = 'X' THEN 1 ELSE 0 END) as completed,
-                SUM(CASE WHEN ZTSYST = 'E' THEN 1 ELSE 0 END) as errors,
-                SUM(CASE WHEN ZTSYST = 'O' THEN 1 ELSE 0 END) as processing,
-                SUM(CASE WHEN ZTSYST = 'P' THEN 1 ELSE 0 END) as pending
-            FROM {SLTK_LIBRARY}.SLTKTRN
-            WHERE ZTGPID = ?
+        loads = get_available_loads()
+    except DatabaseUnavailableError as e:
+        if not fallback:
+            raise
+        print(f"ERROR: Failed to get loads: {e}")
+        loads = []
+
+    # If database query fails, try scanning IFS folders
+    if not loads:
+        folders = scan_dropbox_folders()
+        loads = [{"load_id": f, "description": f"Dropbox folder: {f}"} for f in folders]
+
+    return loads
+
+class LoadCatalog:
+    """
+    In-memory copy of the load list with an ETag
+
+    The catalog is rebuilt at most every refresh_interval seconds or after
+    invalidate(); concurrent requests during a rebuild wait for it instead
+    of querying DB2 or the IFS themselves. loader(fallback) builds the
+    list; while DB2 is unavailable a catalog younger than stale_max_age
+    keeps being served (reported as stale) and the rebuild is retried
+    every retry_interval seconds.
+    """
+
+    def __init__(self, loader, refresh_interval, retry_interval, stale_max_age=None):
+        self._loader = loader
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.stale_max_age = stale_max_age
+        self._loads = None
+        self._etag = None
+        self._fetched_at = None  # time.time() the catalog was built
+        self._refresh_at = None  # time.monotonic() of the next rebuild, None for now
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def get(self):
         """
-        
-        progress_result = query_db(progress_query, [group_id])
-        progress = progress_result[0] if progress_result else {}
-        
-        total = progress.get('total', 0) or 0
-        completed = progress.get('completed', 0) or 0
-        percentage = round((completed / total) * 100) if total > 0 else 0
-        
-        return {
-            'groupId': group['groupId'].strip(),
-            'description': group['description'].strip(),
-            'status': group['status'].strip(),
-            'statusText': get_status_text(group['status']),
-            'changeDate': group['changeDate'],
-            'changeTime': group['changeTime'],
-            'user': group['user'].strip(),
-            'progress': {
-                'total': total,
-                'completed': completed,
-                'errors': progress.get('errors', 0) or 0,
-                'processing': progress.get('processing', 0) or 0,
-                'pending': progress.get('pending', 0) or 0,
-                'percentage': percentage
-            },
-            'timestamp': datetime.now().isoformat()
-        }
-    except Exception as e:
-        print(f"ERROR: get_group_status failed: {e}")
-        raise
+        Return (loads, etag, stale_since), rebuilding the catalog when it expired
 
-def get_errors(group_id):
-    """Get errors for a SLTK group"""
-    try:
-        errors_query = f"""
-            SELECT
-                t.ZTTKEN as token,
-                t.ZTSEQ as sequence,
-                t.ZTSYST as status,
-                e.ZTMSGF as messageFile,
-                e.ZTMSGI as messageId,
-                e.ZTMSGD as messageData,
-                e.ZTMSGT as messageText
-            FROM {SLTK_LIBRARY}.SLTKTRN t
-            LEFT JOIN {SLTK_LIBRARY}.SLTKERR e ON t.ZTTKEN = e.ZTTKEN
-            WHERE t.ZTGPID = ? AND t.ZTSYST = 'E'
-            ORDER BY t.ZTSEQ
+        stale_since is None for a current catalog, else the time.time() the
+        served catalog was built.
         """
+        with self._lock:
+            if self._refresh_at is None or time.monotonic() >= self._refresh_at:
+                keep = (self.stale_max_age is not None and self._loads is not None
+                        and time.time() - self._fetched_at <= self.stale_max_age)
+                try:
+                    loads = self._loader(not keep)
+                except DatabaseUnavailableError as e:
+                    if not keep:
+                        raise
+                    print(f"WARNING: Serving stale load catalog: {e}")
+                    self._stale = True
+                    self._refresh_at = time.monotonic() + self.retry_interval
+                else:
+                    payload = json.dumps(loads, sort_keys=True).encode('utf-8')
+                    self._loads = loads
+                    self._etag = hashlib.sha1(payload).hexdigest()
+                    self._fetched_at = time.time()
+                    self._refresh_at = time.monotonic() + self.refresh_interval
+                    self._stale = False
+            return self._loads, self._etag, self._fetched_at if self._stale else None
 
-        errors = query_db(errors_query, [group_id])
+    def invalidate(self):
+        """Force a rebuild on the next request"""
+        with self._lock:
+            self._refresh_at = None
 
-        # Format errors with resolution guidance
-        formatted_errors = []
-        for err in errors:
-            msg_id = err.get('messageId', '').strip() if err.get('messageId') else None
-            formatted_errors.append({
-                'token': err['token'].strip(),
-                'sequence': err['sequence'],
-                'status': err['status'].strip(),
-                'messageFile': err.get('messageFile', '').strip() if err.get('messageFile') else None,
-                'messageId': msg_id,
-                'messageData': err.get('messageData', '').strip() if err.get('messageData') else None,
-                'messageText': err.get('messageText', '').strip() if err.get('messageText') else None,
-                'resolution': get_error_resolution(msg_id)
-            })
-
-        return formatted_errors
-    except Exception as e:
-        print(f"ERROR: get_errors failed: {e}")
-        raise
+load_catalog = LoadCatalog(
+    lambda fallback: fetch_load_catalog(fallback),
+    refresh_interval=LOAD_CATALOG_REFRESH_INTERVAL,
+    retry_interval=DB_BREAKER_PROBE_INTERVAL,
+    stale_max_age=STALE_MAX_AGE if STALE_FALLBACK else None
+)
 
-def get_error_resolution(message_id):
-    """Get resolution guidance for error codes"""
-    resolutions = {
-        'XML0021': {
-            'issue': 'Object not found',
-            'fix': 'Check object name spelling in spreadsheet. Verify object exists in SLTKOBJ table.',
-            'sql': 'SELECT * FROM SLTKOBJ WHERE ZONAME = \'<object_name>\''
-        },
-        'XML0141': {
-            'issue': 'Profile handle error',
-            'fix': 'Verify user profile exists and has proper authority. Contact system administrator.',
-            'sql': None
-        },
-        'XML0161': {
-            'issue': 'No transactions found in spreadsheet',
-            'fix': 'Check that spreadsheet has data rows. Verify worksheet name matches configuration.',
-            'sql': 'SELECT * FROM SLTKSNU WHERE Z8LOAD = \'<load_name>\''
-        },
-        'XML0162': {
-            'issue': 'Worksheet not found',
-            'fix': 'Verify worksheet name in spreadsheet matches SLTKSNU configuration.',
-            'sql': 'SELECT * FROM SLTKSNU WHERE Z8LOAD = \'<load_name>\''
+# --- Excel Upload Processing ---
+
+def spool_upload(stream, filename, chunk_size=None):
+    """
+    Copy an upload stream to a staging file in fixed-size chunks
+
+    Returns (path, size, sha256 hex digest). The staging file keeps the
+    original extension so openpyxl can open it.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    make_private_dir(UPLOAD_STAGING_DIR)
+    extension = os.path.splitext(filename)[1] or '.xlsx'
+    spool_path = os.path.join(UPLOAD_STAGING_DIR, f"{uuid.uuid4().hex}{extension}")
+
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with open(spool_path, 'wb') as spool:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                spool.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+    except Exception:
+        remove_quietly(spool_path)
+        raise
+    return spool_path, size, digest.hexdigest()
+
+def hash_file(path, chunk_size=None):
+    """SHA-256 hex digest of a file, read in chunks"""
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remove_quietly(path):
+    """Delete a file, ignoring errors (used for temp/spool cleanup)"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def make_private_dir(path):
+    """
+    Create path (mode 0700) if needed and check only this user can use it
+
+    The spool, export and shared state directories live under the world
+    writable temp directory by default, so one pre-created by another user
+    (or a symlink planted in its place) would hand them our lock files and
+    staged uploads. Raises PermissionError for a directory we do not own.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid():
+        raise PermissionError(f"{path} is not a directory owned by this user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+def add_timestamp_streaming(source_path, output_path, timestamp):
+    """
+    Copy a workbook adding the timestamp column, one row at a time
+
+    Uses a read-only source and a write-only target workbook so memory
+    stays flat regardless of sheet size. Every worksheet keeps its title;
+    the header row gets TIMESTAMP_COLUMN and each non-empty data row gets
+    the timestamp value.
+    """
+    source = load_workbook(source_path, read_only=True, data_only=True)
+    try:
+        target = Workbook(write_only=True)
+        for sheet in source.worksheets:
+            out = target.create_sheet(title=sheet.title)
+            width = None
+            for row in sheet.iter_rows(values_only=True):
+                if all(value is None for value in row):
+                    continue
+                values = list(row)
+                if width is None:
+                    # Header row
+                    width = len(values)
+                    out.append(values + [TIMESTAMP_COLUMN])
+                    continue
+                if len(values) < width:
+                    values.extend([None] * (width - len(values)))
+                out.append(values + [timestamp])
+        target.save(output_path)
+    finally:
+        source.close()
+
+def process_excel_file(source_path, output_path, timestamp):
+    """
+    Write a spooled upload into the dropbox, adding the timestamp column
+
+    The result is written to a hidden temp file next to output_path and
+    renamed into place, so SLTKDRP never sees a partially written file.
+    Returns the processing mode used.
+    """
+    output_dir, output_name = os.path.split(output_path)
+    temp_path = os.path.join(output_dir, f".{output_name}.{uuid.uuid4().hex}.tmp")
+
+    try:
+        if EXCEL_PROCESSING_MODE == 'streaming' and OPENPYXL_AVAILABLE:
+            mode = 'streaming'
+            add_timestamp_streaming(source_path, temp_path, timestamp)
+        elif EXCEL_PROCESSING_MODE != 'raw' and PANDAS_AVAILABLE:
+            # Use pandas to read and add timestamp
+            mode = 'pandas'
+            df = pd.read_excel(source_path, engine='openpyxl')
+            df[TIMESTAMP_COLUMN] = timestamp
+            df.to_excel(temp_path, index=False, engine='openpyxl')
+        else:
+            # Fallback: Just save the file as-is
+            mode = 'raw'
+            shutil.copyfile(source_path, temp_path)
+
+        os.replace(temp_path, output_path)
+        return mode
+    except Exception:
+        remove_quietly(temp_path)
+        raise
+
+# --- Pre-flight Validation ---
+
+class PreflightError(ValueError):
+    """A workbook would fail SLTKDRP processing; problems lists the reasons"""
+
+    def __init__(self, problems):
+        super().__init__('; '.join(p['message'] for p in problems))
+        self.problems = problems
+
+snu_worksheets = {}  # loadId -> (loaded at, worksheet names)
+snu_worksheets_lock = threading.Lock()
+
+def get_expected_worksheets(load_id):
+    """Worksheet names SLTKSNU configures for a load (cached like the load catalog)"""
+    with snu_worksheets_lock:
+        cached = snu_worksheets.get(load_id)
+        if cached and time.monotonic() - cached[0] < LOAD_CATALOG_REFRESH_INTERVAL:
+            return cached[1]
+
+    worksheets_query = f"""
+        SELECT DISTINCT {SLTKSNU_SHEET_COLUMN} as worksheet
+        FROM {SLTK_LIBRARY}.SLTKSNU
+        WHERE {SLTKSNU_LOAD_COLUMN} = ?
+    """
+    names = [row.worksheet for row in query_db(worksheets_query, [load_id], name='preflight') if row.worksheet]
+    with snu_worksheets_lock:
+        snu_worksheets[load_id] = (time.monotonic(), names)
+    return names
+
+def load_for_folder(dropbox_folder):
+    """Load ID of a dropbox folder under DROPBOX_ROOT (None for the POC folder)"""
+    parent, name = os.path.split(os.path.normpath(dropbox_folder))
+    if os.path.normpath(parent) != os.path.normpath(DROPBOX_ROOT):
+        return None
+    return name.upper()
+
+def preflight_problem(message_id, message):
+    return {'messageId': message_id, 'message': message, 'resolution': get_error_resolution(message_id)}
+
+def check_worksheets(source_path, expected):
+    """
+    Problems SLTKDRP would report for the expected worksheets of a workbook
+
+    Opens the workbook read-only: sheet names come from the workbook
+    metadata and only the first PREFLIGHT_SAMPLE_ROWS rows of each expected
+    sheet are parsed. A sheet needs a header row and at least one data row.
+    """
+    try:
+        workbook = load_workbook(source_path, read_only=True, data_only=True)
+    except Exception as e:
+        return [{'messageId': None, 'message': f"Workbook cannot be read: {e}", 'resolution': None}]
+
+    problems = []
+    try:
+        sheets = {name.strip().upper(): name for name in workbook.sheetnames}
+        for worksheet in expected:
+            title = sheets.get(worksheet.upper())
+            if title is None:
+                problems.append(preflight_problem(
+                    'XML0162',
+                    f"Worksheet '{worksheet}' not found (workbook has: {', '.join(workbook.sheetnames)})"
+                ))
+                continue
+            rows = workbook[title].iter_rows(max_row=PREFLIGHT_SAMPLE_ROWS, values_only=True)
+            filled = [row for row in rows if any(value is not None and str(value).strip() for value in row)]
+            if len(filled) < 2:
+                problems.append(preflight_problem(
+                    'XML0161', f"Worksheet '{title}' has no data rows below the header"
+                ))
+    finally:
+        workbook.close()
+    return problems
+
+def preflight_workbook(source_path, filename, dropbox_folder, load_id=None):
+    """
+    Raise PreflightError if the workbook does not match SLTKSNU for its load
+
+    Skipped when the load is unknown (POC folder), the database or openpyxl
+    is unavailable, the file is not .xlsx/.xlsm or SLTKSNU has no
+    worksheets for the load.
+    """
+    load_id = (load_id or load_for_folder(dropbox_folder) or '').strip().upper()
+    if (not load_id or not PYODBC_AVAILABLE or not OPENPYXL_AVAILABLE or
+            not filename.lower().endswith(('.xlsx', '.xlsm'))):
+        return
+
+    try:
+        expected = get_expected_worksheets(load_id)
+    except Exception as e:
+        # Validation is an early warning - SLTKDRP still checks the file
+        print(f"WARNING: Pre-flight skipped for {filename} - cannot read SLTKSNU: {e}")
+        return
+    if not expected:
+        print(f"INFO: No SLTKSNU worksheets configured for {load_id} - pre-flight skipped")
+        return
+
+    # The openpyxl parse is CPU and disk work - keep it off the gevent loop
+    problems = run_blocking(check_worksheets, source_path, expected)
+    if problems:
+        print(f"WARNING: {filename} failed pre-flight validation for {load_id}: {len(problems)} problems")
+        raise PreflightError(problems)
+
+# --- Upload Job Queue ---
+
+upload_jobs = {}  # jobId -> job record
+upload_jobs_lock = threading.Lock()
+upload_queue = queue.Queue(maxsize=UPLOAD_QUEUE_DEPTH)
+upload_executor = None
+upload_dispatchers = []
+
+def start_upload_workers():
+    """Start the upload process pool and the threads that feed it"""
+    global upload_executor
+
+    with upload_jobs_lock:
+        if upload_executor is not None:
+            return
+        upload_executor = new_upload_executor()
+        for _ in range(UPLOAD_WORKERS):
+            upload_dispatchers.append(socketio.start_background_task(upload_dispatcher))
+    print(f"INFO: Started {UPLOAD_WORKERS} upload worker processes (queue depth {UPLOAD_QUEUE_DEPTH})")
+
+def new_upload_executor():
+    executor = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, initializer=init_upload_worker)
+    # Fork the worker processes now rather than from a busy request thread
+    for _ in range(UPLOAD_WORKERS):
+        executor.submit(os.getpid)
+    return executor
+
+def replace_broken_upload_executor(broken):
+    """
+    Swap in a new process pool after a worker process died
+
+    A killed worker (OOM, crash) leaves a ProcessPoolExecutor permanently
+    broken. Only the first dispatcher to notice replaces it; the others
+    find the new pool already in place.
+    """
+    global upload_executor
+
+    with upload_jobs_lock:
+        if upload_executor is not broken:
+            return upload_executor
+        upload_executor = new_upload_executor()
+        executor = upload_executor
+    broken.shutdown(wait=False, cancel_futures=True)
+    UPLOAD_POOL_RESTARTS.inc()
+    print("⚠️  WARNING: An upload worker process died - upload process pool restarted")
+    return executor
+
+def run_upload_process(job):
+    """
+    Process a job in the upload pool and return the processing mode
+
+    A dead worker process fails every job the pool was running, not just
+    the one that killed it, so the job is retried once on a new pool. A
+    workbook that kills a worker again fails on its own.
+    """
+    for attempt in range(2):
+        executor = upload_executor
+        if executor is None:
+            raise RuntimeError("Upload workers are stopped")
+        try:
+            future = executor.submit(process_excel_file, job['spoolPath'], job['serverPath'], job['timestamp'])
+            return future.result()
+        except BrokenProcessPool:
+            replace_broken_upload_executor(executor)
+            if attempt:
+                raise RuntimeError("The upload worker process processing this file died")
+
+def init_upload_worker():
+    """Runs in each upload worker process after it is forked"""
+    # Under serve.py the inherited HTTP listening socket must not outlive
+    # the server in a worker process
+    listen_fd = os.environ.get('SLTK_LISTEN_FD')
+    if listen_fd:
+        try:
+            os.close(int(listen_fd))
+        except OSError:
+            pass
+
+def stop_upload_workers():
+    """Let running uploads finish, then stop the upload worker processes"""
+    global upload_executor
+
+    with upload_jobs_lock:
+        executor, upload_executor = upload_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        print("INFO: Upload worker processes stopped")
+
+def upload_dispatcher():
+    """Thread that hands queued upload jobs to the process pool one at a time"""
+    while True:
+        job_id = upload_queue.get()
+        job = upload_jobs.get(job_id)
+        if job is None:
+            continue
+
+        update_upload_job(job_id, state='processing')
+        started = time.perf_counter()
+        try:
+            mode = run_upload_process(job)
+            UPLOAD_SECONDS.observe(time.perf_counter() - started, mode)
+            UPLOADS.inc(1, 'dropped')
+            update_upload_job(job_id, state='dropped', mode=mode)
+            print(f"✅ SUCCESS: Upload job {job_id} processed ({mode}) and saved to {job['serverPath']}")
+        except Exception as e:
+            UPLOADS.inc(1, 'failed')
+            update_upload_job(job_id, state='failed', error=str(e))
+            if job['sha256']:
+                forget_dropped_file(os.path.dirname(job['serverPath']), job['sha256'])
+            print(f"ERROR: Upload job {job_id} failed: {e}")
+        finally:
+            remove_quietly(job['spoolPath'])
+
+def submit_upload_job(spool_path, size, filename, output_path, load_id, timestamp, sha256=None):
+    """
+    Queue a spooled upload for background processing
+
+    Returns the job as first queued. Raises queue.Full when
+    UPLOAD_QUEUE_DEPTH jobs are already waiting.
+    """
+    start_upload_workers()
+    prune_upload_jobs()
+
+    job_id = uuid.uuid4().hex
+    now = datetime.now().isoformat()
+    job = {
+        'jobId': job_id,
+        'filename': filename,
+        'loadId': load_id,
+        'serverPath': output_path,
+        'size': size,
+        'sha256': sha256,
+        'state': 'queued',
+        'mode': None,
+        'error': None,
+        'createdAt': now,
+        'updatedAt': now,
+        'spoolPath': spool_path,
+        'timestamp': timestamp
+    }
+    snapshot = public_upload_job(job)
+    with upload_jobs_lock:
+        upload_jobs[job_id] = job
+    try:
+        upload_queue.put_nowait(job_id)
+    except queue.Full:
+        with upload_jobs_lock:
+            del upload_jobs[job_id]
+        raise
+    share_upload_job(snapshot)
+    socket_emit('upload-status', snapshot, room=upload_room(job_id))
+    return snapshot
+
+def update_upload_job(job_id, **changes):
+    """Update a job record and notify clients watching it"""
+    with upload_jobs_lock:
+        job = upload_jobs[job_id]
+        job.update(changes)
+        job['updatedAt'] = datetime.now().isoformat()
+        payload = public_upload_job(job)
+    share_upload_job(payload)
+    socket_emit('upload-status', payload, room=upload_room(job_id))
+
+def prune_upload_jobs():
+    """Forget finished jobs older than UPLOAD_JOB_RETENTION"""
+    cutoff = datetime.fromtimestamp(time.time() - UPLOAD_JOB_RETENTION).isoformat()
+    with upload_jobs_lock:
+        expired = [j for j, job in upload_jobs.items()
+                   if job['state'] in ('dropped', 'failed') and job['updatedAt'] < cutoff]
+        for job_id in expired:
+            del upload_jobs[job_id]
+    if WORKERS > 1:
+        for job_id in expired:
+            remove_quietly(shared_upload_job_path(job_id))
+
+def shared_upload_job_path(job_id):
+    return os.path.join(SHARED_STATE_DIR, 'uploads', f"{job_id}.json")
+
+def share_upload_job(payload):
+    """Publish a job's state to the other worker processes (multi-worker mode)"""
+    if WORKERS <= 1:
+        return
+    path = shared_upload_job_path(payload['jobId'])
+    make_private_dir(SHARED_STATE_DIR)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(payload, f)
+    os.replace(temp_path, path)
+
+def find_upload_job(job_id):
+    """Public record of a job accepted by this or (multi-worker) any other worker"""
+    with upload_jobs_lock:
+        job = upload_jobs.get(job_id)
+        if job:
+            return public_upload_job(job)
+    if WORKERS <= 1 or not job_id.isalnum():
+        return None
+    try:
+        with open(shared_upload_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def public_upload_job(job):
+    """Job record as returned to clients (internal paths removed)"""
+    return {k: v for k, v in job.items() if k not in ('spoolPath', 'timestamp')}
+
+def upload_room(job_id):
+    return f"upload:{job_id}"
+
+# --- Upload Deduplication ---
+
+upload_hashes_lock = threading.Lock()
+
+def upload_hash_index_path(dropbox_folder):
+    name = os.path.basename(os.path.normpath(dropbox_folder)) or 'root'
+    return os.path.join(UPLOAD_HASH_INDEX_DIR, f"{name}.json")
+
+def read_upload_hash_index(dropbox_folder):
+    """sha256 -> drop record for one dropbox folder, without expired entries"""
+    try:
+        with open(upload_hash_index_path(dropbox_folder)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    cutoff = time.time() - UPLOAD_HASH_RETENTION
+    return {digest: record for digest, record in index.items() if record['droppedAt'] >= cutoff}
+
+def write_upload_hash_index(dropbox_folder, index):
+    path = upload_hash_index_path(dropbox_folder)
+    os.makedirs(UPLOAD_HASH_INDEX_DIR, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(temp_path, path)
+
+@contextmanager
+def upload_hash_index_lock(dropbox_folder):
+    """
+    Hold the hash index of dropbox_folder for a read-modify-write
+
+    Threads of this process serialize on upload_hashes_lock; worker
+    processes (SLTK_WORKERS > 1) on a POSIX lock of a sidecar file next to
+    the index, so two workers never claim the same hash or overwrite each
+    other's entries.
+    """
+    with upload_hashes_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(UPLOAD_HASH_INDEX_DIR, exist_ok=True)
+        with open(upload_hash_index_path(dropbox_folder) + '.lock', 'a') as lock_file:
+            fcntl.lockf(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN)
+
+def claim_dropped_file(dropbox_folder, sha256, filename):
+    """
+    Record a file about to be dropped into dropbox_folder
+
+    Returns None when the content is new, otherwise the record of the
+    identical file dropped earlier (the new one should be skipped).
+    """
+    with upload_hash_index_lock(dropbox_folder):
+        index = read_upload_hash_index(dropbox_folder)
+        previous = index.get(sha256)
+        if previous:
+            return previous
+        index[sha256] = {'filename': filename, 'droppedAt': time.time()}
+        write_upload_hash_index(dropbox_folder, index)
+    return None
+
+def forget_dropped_file(dropbox_folder, sha256):
+    """Remove a hash again, e.g. when processing the file failed"""
+    with upload_hash_index_lock(dropbox_folder):
+        index = read_upload_hash_index(dropbox_folder)
+        if index.pop(sha256, None) is not None:
+            write_upload_hash_index(dropbox_folder, index)
+
+def duplicate_upload_response(filename, load_id, sha256, previous):
+    dropped_at = datetime.fromtimestamp(previous['droppedAt']).strftime('%Y-%m-%d %H:%M:%S')
+    print(f"INFO: Skipped {filename} - identical to {previous['filename']} dropped at {dropped_at}")
+    UPLOADS.inc(1, 'duplicate')
+    return {
+        "status": "success",
+        "duplicate": True,
+        "message": f"File '{filename}' is identical to '{previous['filename']}' already dropped "
+                   f"for {load_id or 'this load'} at {dropped_at} - skipped. Send force=true to drop it again.",
+        "sha256": sha256
+    }
+
+def prepare_upload_target(spool_path, filename, load_id, sha256, force=False, validate=None):
+    """
+    Resolve (and create) the dropbox folder for an upload and claim its hash
+
+    Returns (dropbox_folder, previous) where previous is the record of an
+    identical file already dropped there, if any. Raises OSError when the
+    folder cannot be created and PreflightError when validation (default
+    PREFLIGHT_VALIDATION) rejects the workbook.
+    """
+    # Dynamically determine dropbox folder
+    dropbox_folder = get_dropbox_folder(load_id=load_id, filename=filename)
+
+    print(f"INFO: Using dropbox folder: {dropbox_folder}")
+    print(f"INFO: Load ID: {load_id if load_id else 'Auto-detected from filename'}")
+
+    # Create folder if needed (indexed folders are known to exist)
+    if not dropbox_index.is_known(dropbox_folder):
+        os.makedirs(dropbox_folder, exist_ok=True)
+        print(f"SUCCESS: Directory verified: {dropbox_folder}")
+
+    if (PREFLIGHT_VALIDATION if validate is None else validate):
+        preflight_workbook(spool_path, filename, dropbox_folder, load_id)
+
+    previous = None
+    if UPLOAD_DEDUPLICATION:
+        if force:
+            forget_dropped_file(dropbox_folder, sha256)
+        previous = claim_dropped_file(dropbox_folder, sha256, filename)
+    return dropbox_folder, previous
+
+def preflight_response(filename, error):
+    UPLOADS.inc(1, 'rejected')
+    return {
+        "status": "error",
+        "message": f"File '{filename}' was not dropped - it would fail SLTKDRP processing: {error}",
+        "errors": error.problems
+    }
+
+def deliver_upload(spool_path, size, sha256, filename, load_id=None, force=False, validate=None):
+    """
+    Drop a spooled upload into its load's dropbox folder
+
+    Skips content already dropped for the same load (unless force), then
+    queues the file for background processing or processes it inline.
+    Returns (response payload, HTTP status). The spool file is always
+    consumed.
+    """
+    handed_off = False
+    try:
+        try:
+            dropbox_folder, previous = prepare_upload_target(spool_path, filename, load_id, sha256, force, validate)
+        except OSError as folder_error:
+            return {"status": "error", "message": f"Cannot create folder: {folder_error}"}, 500
+        except PreflightError as e:
+            return preflight_response(filename, e), 422
+        if previous:
+            return duplicate_upload_response(filename, load_id, sha256, previous), 200
+
+        # Save file to IFS folder
+        output_path = os.path.join(dropbox_folder, filename)
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        UPLOAD_BYTES.observe(size)
+
+        if ASYNC_UPLOADS:
+            try:
+                job = submit_upload_job(spool_path, size, filename, output_path, load_id, timestamp,
+                                        sha256 if UPLOAD_DEDUPLICATION else None)
+            except queue.Full:
+                if UPLOAD_DEDUPLICATION:
+                    forget_dropped_file(dropbox_folder, sha256)
+                UPLOADS.inc(1, 'rejected')
+                return {"status": "error", "message": "Upload queue is full - please retry shortly"}, 503
+            handed_off = True
+
+            print(f"INFO: Upload job {job['jobId']} queued for {output_path}")
+
+            return {
+                "status": "success",
+                "message": f"File '{filename}' accepted for processing. SLTKDRP will process it once it is dropped.",
+                "job_id": job['jobId'],
+                "state": job['state'],
+                "server_path": output_path,
+                "sha256": sha256,
+                "next_steps": f"Track the upload using /api/uploads/{job['jobId']} or the 'watch-upload' WebSocket event"
+            }, 202
+
+        started = time.perf_counter()
+        try:
+            mode = run_blocking(process_excel_file, spool_path, output_path, timestamp)
+        except Exception:
+            UPLOADS.inc(1, 'failed')
+            if UPLOAD_DEDUPLICATION:
+                forget_dropped_file(dropbox_folder, sha256)
+            raise
+        UPLOAD_SECONDS.observe(time.perf_counter() - started, mode)
+        UPLOADS.inc(1, 'dropped')
+
+        if mode == 'raw':
+            print(f"✅ SUCCESS: File saved to {output_path} (without timestamp processing)")
+            print(f"⚠️  WARNING: Timestamp column not added (openpyxl/pandas not available)")
+        else:
+            print(f"✅ SUCCESS: File processed ({mode}, {size} bytes) and saved to {output_path}")
+
+        print(f"INFO: SLTKDRP will process this file automatically")
+
+        return {
+            "status": "success",
+            "message": f"File '{filename}' uploaded successfully. SLTKDRP will process it automatically.",
+            "server_path": output_path,
+            "sha256": sha256,
+            "next_steps": "Monitor the upload using /api/status/<groupId> endpoint"
+        }, 200
+    finally:
+        if not handed_off:
+            remove_quietly(spool_path)
+
+# --- Bulk Uploads ---
+
+def spool_bulk_upload(files):
+    """
+    Spool the workbooks of a bulk request, unpacking zip archives
+
+    Returns a list of entries {filename, spoolPath, size, sha256} (zip
+    members also carry their path in the archive as source) or {filename,
+    status: 'skipped', error} for archive members that are not workbooks. Raises ValueError when the request exceeds
+    BULK_UPLOAD_MAX_FILES or BULK_UPLOAD_MAX_BYTES; spooled files are
+    removed in that case.
+    """
+    entries = []
+    total = 0
+
+    def add(stream, name, source=None):
+        nonlocal total
+        if len([e for e in entries if 'spoolPath' in e]) >= BULK_UPLOAD_MAX_FILES:
+            raise ValueError(f"Too many files - at most {BULK_UPLOAD_MAX_FILES} per request")
+        spool_path, size, sha256 = spool_upload(stream, name)
+        entries.append({'filename': name, 'spoolPath': spool_path, 'size': size, 'sha256': sha256})
+        if source:
+            entries[-1]['source'] = source
+        total += size
+        if total > BULK_UPLOAD_MAX_BYTES:
+            raise ValueError(f"Request exceeds {BULK_UPLOAD_MAX_BYTES} bytes")
+
+    try:
+        for file in files:
+            filename = os.path.basename(file.filename or '')
+            if not filename:
+                continue
+            if not filename.lower().endswith('.zip'):
+                add(file.stream, filename)
+                continue
+
+            archive_path, _, _ = spool_upload(file.stream, filename)
+            try:
+                with zipfile.ZipFile(archive_path) as archive:
+                    members = [m for m in archive.infolist() if not m.is_dir()]
+                    # Declared sizes are checked before anything is extracted;
+                    # zipfile never returns more than a member's declared size
+                    if total + sum(m.file_size for m in members) > BULK_UPLOAD_MAX_BYTES:
+                        raise ValueError(f"Archive {filename} unpacks to more than {BULK_UPLOAD_MAX_BYTES} bytes")
+                    for member in members:
+                        # Only the base name is used - no paths from the archive reach the disk
+                        name = os.path.basename(member.filename)
+                        if (not name or name.startswith('.') or '__MACOSX' in member.filename or
+                                not name.lower().endswith(BULK_UPLOAD_EXTENSIONS)):
+                            entries.append({'filename': member.filename, 'status': 'skipped',
+                                            'error': 'Not a workbook'})
+                            continue
+                        with archive.open(member) as stream:
+                            add(stream, name, f"{filename}/{member.filename}")
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"Archive {filename} is not a valid zip file: {e}")
+            finally:
+                remove_quietly(archive_path)
+    except Exception:
+        for entry in entries:
+            if 'spoolPath' in entry:
+                remove_quietly(entry['spoolPath'])
+        raise
+    return entries
+
+def process_bulk_upload(entries, load_id=None, force=False, validate=None):
+    """
+    Queue the spooled files of a bulk request for the upload workers
+
+    New files go through the same bounded queue as single uploads, so the
+    UPLOAD_WORKERS processes work on them in parallel and at most
+    UPLOAD_QUEUE_DEPTH wait; files that do not fit are refused. A file
+    whose dropbox path was already taken by an earlier file of the request
+    (same name from different zip folders) is rejected rather than
+    overwriting it. Returns one result per entry, in request order. Spool
+    files not handed to a job are always removed.
+    """
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    results = []
+    handed_off = set()
+    targets = {}  # dropbox path -> (file, sha256) of this request queued for it
+
+    try:
+        for entry in entries:
+            result = {'filename': entry['filename'], 'status': entry.get('status'), 'error': entry.get('error')}
+            if 'source' in entry:
+                result['source'] = entry['source']
+            results.append(result)
+            if 'spoolPath' not in entry:
+                continue
+
+            result['sha256'] = entry['sha256']
+            try:
+                dropbox_folder, previous = prepare_upload_target(
+                    entry['spoolPath'], entry['filename'], load_id, entry['sha256'], force, validate
+                )
+            except OSError as folder_error:
+                result.update(status='failed', error=f"Cannot create folder: {folder_error}")
+                UPLOADS.inc(1, 'failed')
+                continue
+            except PreflightError as e:
+                result.update(status='rejected', error=str(e), errors=e.problems)
+                UPLOADS.inc(1, 'rejected')
+                continue
+            except Exception as e:
+                print(f"ERROR: Bulk upload of {entry['filename']} failed: {e}")
+                result.update(status='failed', error=str(e))
+                UPLOADS.inc(1, 'failed')
+                continue
+            if previous:
+                duplicate = duplicate_upload_response(entry['filename'], load_id, entry['sha256'], previous)
+                result.update(status='duplicate', error=duplicate['message'])
+                continue
+
+            output_path = os.path.join(dropbox_folder, entry['filename'])
+            target = os.path.normcase(os.path.abspath(output_path))
+            if target in targets:
+                queued_file, queued_sha256 = targets[target]
+                if UPLOAD_DEDUPLICATION and entry['sha256'] != queued_sha256:
+                    forget_dropped_file(dropbox_folder, entry['sha256'])
+                result.update(status='rejected',
+                              error=f"{queued_file} in this request already goes to {output_path} - rename one of them")
+                UPLOADS.inc(1, 'rejected')
+                continue
+            UPLOAD_BYTES.observe(entry['size'])
+            try:
+                job = submit_upload_job(entry['spoolPath'], entry['size'], entry['filename'], output_path,
+                                        load_id, timestamp, entry['sha256'] if UPLOAD_DEDUPLICATION else None)
+            except queue.Full:
+                if UPLOAD_DEDUPLICATION:
+                    forget_dropped_file(dropbox_folder, entry['sha256'])
+                UPLOADS.inc(1, 'rejected')
+                result.update(status='refused', error="Upload queue is full - please retry shortly")
+                continue
+            handed_off.add(entry['spoolPath'])
+            targets[target] = (entry.get('source', entry['filename']), entry['sha256'])
+            result.update(status='queued', jobId=job['jobId'], serverPath=output_path)
+    finally:
+        for entry in entries:
+            if 'spoolPath' in entry and entry['spoolPath'] not in handed_off:
+                remove_quietly(entry['spoolPath'])
+
+    return results
+
+# --- Chunked Uploads ---
+
+def upload_session_dir():
+    return os.path.join(UPLOAD_STAGING_DIR, 'sessions')
+
+def upload_session_paths(upload_id):
+    """(metadata, data) paths of a chunked upload session"""
+    base = os.path.join(upload_session_dir(), upload_id)
+    return f"{base}.json", f"{base}.part"
+
+def create_upload_session(filename, size, load_id=None, sha256=None, force=False):
+    """Start a chunked upload; the data file grows as chunks arrive"""
+    prune_upload_sessions()
+    make_private_dir(UPLOAD_STAGING_DIR)
+    os.makedirs(upload_session_dir(), mode=0o700, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    session = {
+        'uploadId': upload_id,
+        'filename': filename,
+        'size': size,
+        'loadId': load_id,
+        'sha256': sha256,
+        'force': force,
+        'createdAt': time.time()
+    }
+    meta_path, data_path = upload_session_paths(upload_id)
+    open(data_path, 'wb').close()
+    with open(meta_path, 'w') as f:
+        json.dump(session, f)
+    return session
+
+def find_upload_session(upload_id):
+    """Session metadata plus the bytes received so far, or None"""
+    if not upload_id.isalnum():
+        return None
+    meta_path, data_path = upload_session_paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            session = json.load(f)
+        session['offset'] = os.path.getsize(data_path)
+    except (OSError, ValueError):
+        return None
+    return session
+
+class UploadBusyError(ValueError):
+    """Raised when another request is still writing to the same chunked upload"""
+
+upload_sessions_writing = set()  # uploadIds with a chunk being written by this process
+upload_sessions_lock = threading.Lock()
+
+def append_upload_chunk(session, offset, stream, chunk_size=None):
+    """
+    Append a chunk sent for offset to the session's data file
+
+    Returns the new offset. Raises ValueError when offset is not the number
+    of bytes received so far or the chunk runs past the declared size, and
+    UploadBusyError when another request (a client retry, or a request on
+    another worker) is writing to the upload - their writes and truncates
+    would interleave otherwise.
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    upload_id = session['uploadId']
+    _, data_path = upload_session_paths(upload_id)
+    with upload_sessions_lock:
+        if upload_id in upload_sessions_writing:
+            raise UploadBusyError("Another request is writing to this upload")
+        upload_sessions_writing.add(upload_id)
+    try:
+        with open(data_path, 'ab') as data:
+            if fcntl is not None:
+                try:
+                    fcntl.lockf(data, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    raise UploadBusyError("Another request is writing to this upload")
+            received = data.seek(0, os.SEEK_END)
+            if offset != received:
+                raise ValueError(f"Expected offset {received}, got {offset}")
+            try:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    if received + len(chunk) > session['size']:
+                        raise ValueError(f"Chunk exceeds the declared size of {session['size']} bytes")
+                    data.write(chunk)
+                    received += len(chunk)
+            except Exception:
+                # Drop a partial chunk so the client can resend it from offset
+                data.truncate(offset)
+                raise
+    finally:
+        with upload_sessions_lock:
+            upload_sessions_writing.discard(upload_id)
+    return received
+
+def remove_upload_session(upload_id):
+    for path in upload_session_paths(upload_id):
+        remove_quietly(path)
+
+def prune_upload_sessions():
+    """Remove chunked uploads not completed within UPLOAD_SESSION_RETENTION"""
+    cutoff = time.time() - UPLOAD_SESSION_RETENTION
+    try:
+        names = os.listdir(upload_session_dir())
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(upload_session_dir(), name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+# --- Helper Functions ---
+def get_status_text(status):
+    """Convert status code to human-readable text"""
+    status_map = {
+        'P': 'Preparing',
+        'R': 'Ready',
+        'O': 'Processing',
+        'X': 'Success',
+        'E': 'Error',
+        'C': 'Cancelled',
+        'V': 'Validation Error'
+    }
+    return status_map.get(status.strip(), 'Unknown')
+
+def sql_in_chunks(values, chunk_size=None):
+    """
+    Split values into chunks small enough for one IN (...) predicate
+
+    Short chunks are padded to a power of two by repeating their last value,
+    so an IN list - and the statement text built from it - only takes a few
+    shapes that the driver can keep prepared.
+    """
+    chunk_size = chunk_size or SQL_IN_CHUNK_SIZE
+    values = list(values)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        padded_size = min(fetch_first_rows(len(chunk)), chunk_size)
+        yield chunk + chunk[-1:] * (padded_size - len(chunk))
+
+def build_group_status(group, progress):
+    """Build the status payload for a group row and its progress counts (None if no transactions)"""
+    total, completed, errors, processing, pending = (
+        [value or 0 for value in (progress.total, progress.completed, progress.errors,
+                                  progress.processing, progress.pending)]
+        if progress else (0, 0, 0, 0, 0)
+    )
+    percentage = round((completed / total) * 100) if total > 0 else 0
+
+    return {
+        'groupId': group.groupId,
+        'description': group.description,
+        'status': group.status,
+        'statusText': get_status_text(group.status),
+        'changeDate': group.changeDate,
+        'changeTime': group.changeTime,
+        'user': group.user,
+        'progress': {
+            'total': total,
+            'completed': completed,
+            'errors': errors,
+            'processing': processing,
+            'pending': pending,
+            'percentage': percentage
         },
-        'XML0163': {
-            'issue': 'Worksheet processed (informational)',
-            'fix': 'No action needed - this is an informational message.',
-            'sql': None
-        }
+        'timestamp': datetime.now().isoformat()
+    }
+
+def group_watermark(group, previous=None):
+    """
+    Cheap change marker for a group: status, change stamp and latest transaction change
+
+    The transaction stamp has one-second resolution, so rows changed later
+    in the same second as a read carry the stamp that read already saw. A
+    watermark is only settled (last element True) once the aggregation ran
+    again with the same stamps as previous; until then it differs from
+    previous and the next poll aggregates once more.
+    """
+    stamps = (group.status, group.changeDate, group.changeTime, group.trnMarker)
+    settled = previous is not None and tuple(previous[:4]) == stamps
+    return stamps + (settled,)
+
+def get_group_snapshots(group_ids, previous=None):
+    """
+    Get (watermark, status) for several SLTK groups with set-based queries
+
+    Each chunk of group IDs costs one SLTKGRP lookup that also returns the
+    latest change stamp of the group's transactions (an index probe). The
+    SLTKTRN progress aggregation only runs for groups whose watermark
+    differs from the one in previous (groupId -> (watermark, status));
+    unchanged groups reuse their previous progress. Unknown groups are
+    omitted.
+    """
+    group_ids = list(dict.fromkeys(str(g).strip() for g in group_ids if g and str(g).strip()))
+    previous = previous or {}
+    snapshots = {}
+    trn_date, trn_time = TRN_CHANGE_COLUMNS
+
+    try:
+        for chunk in sql_in_chunks(group_ids):
+            markers = ', '.join('?' for _ in chunk)
+
+            # Get group information plus the transaction change marker
+            group_query = f"""
+                SELECT
+                    g.ZGGPID as groupId,
+                    g.ZGGPDS as description,
+                    g.ZGGPST as status,
+                    g.ZGCHDT as changeDate,
+                    g.ZGCHTM as changeTime,
+                    g.ZGUSER as user,
+                    (SELECT t.{trn_date} * 1000000 + t.{trn_time}
+                       FROM {SLTK_LIBRARY}.SLTKTRN t
+                      WHERE t.ZTGPID = g.ZGGPID
+                      ORDER BY t.{trn_date} DESC, t.{trn_time} DESC
+                      FETCH FIRST 1 ROW ONLY) as trnMarker
+                FROM {SLTK_LIBRARY}.SLTKGRP g
+                WHERE g.ZGGPID IN ({markers})
+            """
+            changed = {}
+            for group in query_db(group_query, chunk, name='group_status'):
+                group_id = group.groupId
+                known = previous.get(group_id)
+                watermark = group_watermark(group, known[0] if known else None)
+                if known and known[0] == watermark:
+                    snapshots[group_id] = (watermark, dict(known[1], timestamp=datetime.now().isoformat()))
+                else:
+                    changed[group_id] = (watermark, group)
+
+            if not changed:
+                continue
+
+            # Get transaction counts only for groups that changed
+            changed_ids = next(sql_in_chunks(changed))
+            changed_markers = ', '.join('?' for _ in changed_ids)
+            progress_query = f"""
+                SELECT
+                    ZTGPID as groupId,
+                    COUNT(*) as total,
+                    SUM(CASE WHEN ZTSYST = 'X' THEN 1 ELSE 0 END) as completed,
+                    SUM(CASE WHEN ZTSYST = 'E' THEN 1 ELSE 0 END) as errors,
+                    SUM(CASE WHEN ZTSYST = 'O' THEN 1 ELSE 0 END) as processing,
+                    SUM(CASE WHEN ZTSYST = 'P' THEN 1 ELSE 0 END) as pending
+                FROM {SLTK_LIBRARY}.SLTKTRN
+                WHERE ZTGPID IN ({changed_markers})
+                GROUP BY ZTGPID
+            """
+            progress_by_group = {
+                row.groupId: row
+                for row in query_db(progress_query, changed_ids, name='progress')
+            }
+
+            for group_id, (watermark, group) in changed.items():
+                status = build_group_status(group, progress_by_group.get(group_id))
+                snapshots[group_id] = (watermark, status)
+
+        return snapshots
+    except Exception as e:
+        print(f"ERROR: get_group_snapshots failed: {e}")
+        raise
+
+def get_group_statuses(group_ids):
+    """Get current status of several SLTK groups; returns groupId -> status"""
+    return {
+        group_id: status
+        for group_id, (_, status) in get_group_snapshots(group_ids).items()
     }
 
-    return resolutions.get(message_id, {
-        'issue': 'Unknown error',
-        'fix': 'Review error message and contact support if needed.',
+def get_group_status(group_id, previous=None):
+    """
+    Get current status of a SLTK group
+
+    previous is an earlier (watermark, status) snapshot of the group; when
+    the group has not changed since, the progress aggregation is skipped.
+    """
+    snapshot = load_group_snapshot(group_id, previous)
+    return snapshot[1] if snapshot else None
+
+def load_group_snapshot(group_id, previous=None):
+    """Get the (watermark, status) snapshot of one group"""
+    group_id = str(group_id).strip()
+    known = {group_id: previous} if previous else None
+    return get_group_snapshots([group_id], known).get(group_id)
+
+# --- Status Cache ---
+
+class _InFlightLoad:
+    """A status lookup in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class StatusCache:
+    """
+    Shared in-process cache of group (watermark, status) snapshots
+
+    Entries expire after ttl seconds (finished_ttl for groups that reached a
+    final status) and the least recently used entries are evicted beyond
+    max_size. Concurrent misses for the same group are coalesced so only
+    one caller runs the DB lookup while the others wait for its result.
+    An expired snapshot is handed to the loader so it can skip work when
+    the group has not changed, and stays available as a stale fallback
+    (get_stale) until it is evicted.
+    """
+
+    def __init__(self, ttl, finished_ttl, max_size):
+        self.ttl = ttl
+        self.finished_ttl = finished_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # groupId -> ((watermark, status), expires_at, fetched_at)
+        self._inflight = {}  # groupId -> _InFlightLoad
+        self._lock = threading.Lock()
+
+    def get(self, group_id, loader):
+        """
+        Return the cached status for group_id, loading it on a miss
+
+        loader(group_id, expired_snapshot) returns a (watermark, status)
+        snapshot, or None when the group does not exist.
+        """
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(group_id)
+                return entry[0][1]
+            expired = entry[0] if entry else None
+            flight = self._inflight.get(group_id)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._inflight[group_id] = _InFlightLoad()
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            snapshot = loader(group_id, expired)
+            if snapshot:
+                self.put(group_id, snapshot)
+                flight.result = snapshot[1]
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[group_id]
+            flight.done.set()
+
+    def get_many(self, group_ids, loader):
+        """
+        Return {groupId: status} for the groups of group_ids that exist
+
+        All misses are loaded with one loader(missing_ids, expired_snapshots)
+        call returning {groupId: snapshot}; groups another caller is already
+        loading are waited for instead.
+        """
+        results = {}
+        expired = {}
+        owned = {}  # groupId -> _InFlightLoad this call resolves
+        waiting = {}  # groupId -> _InFlightLoad of another caller
+        with self._lock:
+            now = time.monotonic()
+            for group_id in group_ids:
+                entry = self._entries.get(group_id)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(group_id)
+                    results[group_id] = entry[0][1]
+                    continue
+                if entry:
+                    expired[group_id] = entry[0]
+                flight = self._inflight.get(group_id)
+                if flight is None:
+                    owned[group_id] = self._inflight[group_id] = _InFlightLoad()
+                else:
+                    waiting[group_id] = flight
+
+        if owned:
+            try:
+                snapshots = loader(list(owned), {g: expired[g] for g in owned if g in expired})
+                for group_id, flight in owned.items():
+                    snapshot = snapshots.get(group_id)
+                    if snapshot:
+                        self.put(group_id, snapshot)
+                        flight.result = results[group_id] = snapshot[1]
+            except Exception as e:
+                for flight in owned.values():
+                    flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    for group_id in owned:
+                        del self._inflight[group_id]
+                for flight in owned.values():
+                    flight.done.set()
+
+        for group_id, flight in waiting.items():
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            if flight.result:
+                results[group_id] = flight.result
+        return results
+
+    def put(self, group_id, snapshot):
+        """Store a freshly fetched (watermark, status) snapshot"""
+        ttl = self.finished_ttl if snapshot[1]['status'] in FINISHED_STATUSES else self.ttl
+        with self._lock:
+            self._entries[group_id] = (snapshot, time.monotonic() + ttl, time.time())
+            self._entries.move_to_end(group_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def put_many(self, snapshots):
+        for group_id, snapshot in snapshots.items():
+            self.put(group_id, snapshot)
+
+    def get_stale(self, group_ids, max_age):
+        """
+        {groupId: (status, fetched_at)} of cached groups, expired or not
+
+        Used when DB2 is unavailable; entries fetched more than max_age
+        seconds ago are left out.
+        """
+        cutoff = time.time() - max_age
+        with self._lock:
+            entries = [(g, self._entries.get(g)) for g in group_ids]
+        return {g: (entry[0][1], entry[2]) for g, entry in entries if entry and entry[2] >= cutoff}
+
+    def invalidate(self, group_id=None):
+        """Drop one group, or everything when group_id is None"""
+        with self._lock:
+            if group_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(group_id, None)
+
+status_cache = StatusCache(
+    ttl=STATUS_CACHE_TTL,
+    finished_ttl=STATUS_CACHE_FINISHED_TTL,
+    max_size=STATUS_CACHE_MAX_SIZE
+)
+
+def get_cached_group_status(group_id):
+    """Get the status of a SLTK group through the shared status cache"""
+    return status_cache.get(str(group_id).strip(), load_group_snapshot)
+
+def get_cached_group_statuses(group_ids):
+    """Get {groupId: status} for several groups through the shared status cache"""
+    return status_cache.get_many(group_ids, get_group_snapshots)
+
+def parse_group_ids(value):
+    """Unique, stripped group IDs from a comma-separated string or a list"""
+    if isinstance(value, str):
+        value = value.split(',')
+    group_ids = []
+    for group_id in value or []:
+        group_id = str(group_id).strip()
+        if group_id and group_id not in group_ids:
+            group_ids.append(group_id)
+    return group_ids
+
+def build_errors_query(after_seq=None, limit=None):
+    """
+    SQL and extra params for a group's failed transactions joined to SLTKERR
+
+    With after_seq only transactions with a higher ZTSEQ are included. With
+    limit at most that many failed transactions are joined, so a page never
+    splits the messages of one transaction.
+    """
+    trn_conditions = ["ZTGPID = ?", "ZTSYST = 'E'"]
+    params = []
+    if after_seq is not None:
+        trn_conditions.append("ZTSEQ > ?")
+        params.append(after_seq)
+
+    fetch_clause = f"FETCH FIRST {fetch_first_rows(limit)} ROWS ONLY" if limit else ""
+
+    errors_query = f"""
+        SELECT
+            t.ZTTKEN as token,
+            t.ZTSEQ as sequence,
+            t.ZTSYST as status,
+            e.ZTMSGF as messageFile,
+            e.ZTMSGI as messageId,
+            e.ZTMSGD as messageData,
+            e.ZTMSGT as messageText
+        FROM (
+            SELECT ZTTKEN, ZTSEQ, ZTSYST
+            FROM {SLTK_LIBRARY}.SLTKTRN
+            WHERE {' AND '.join(trn_conditions)}
+            ORDER BY ZTSEQ
+            {fetch_clause}
+        ) t
+        LEFT JOIN {SLTK_LIBRARY}.SLTKERR e ON t.ZTTKEN = e.ZTTKEN
+        ORDER BY t.ZTSEQ
+    """
+    return errors_query, params
+
+def format_error(err):
+    """Format an error row with resolution guidance"""
+    return {
+        'token': err.token,
+        'sequence': err.sequence,
+        'status': err.status,
+        'messageFile': err.messageFile,
+        'messageId': err.messageId,
+        'messageData': err.messageData,
+        'messageText': err.messageText,
+        'resolution': get_error_resolution(err.messageId)
+    }
+
+def get_errors(group_id, after_seq=None, limit=None):
+    """Get errors for a SLTK group, optionally one page of failed transactions"""
+    try:
+        errors_query, params = build_errors_query(after_seq, limit)
+        errors = query_db(errors_query, [group_id] + params, name='errors')
+
+        if limit:
+            # FETCH FIRST is rounded up - keep the first limit transactions
+            sequences = set()
+            for index, err in enumerate(errors):
+                sequences.add(err.sequence)
+                if len(sequences) > limit:
+                    errors = errors[:index]
+                    break
+
+        # Format errors with resolution guidance
+        return [format_error(err) for err in errors]
+    except Exception as e:
+        print(f"ERROR: get_errors failed: {e}")
+        raise
+
+def iter_errors(group_id, after_seq=None):
+    """Yield formatted errors for a SLTK group without materializing them all"""
+    errors_query, params = build_errors_query(after_seq)
+    for err in iter_query(errors_query, [group_id] + params, name='errors_stream'):
+        yield format_error(err)
+
+def get_error_marks(group_ids):
+    """Highest failed ZTSEQ per group (0 for groups without errors)"""
+    marks = {group_id: 0 for group_id in group_ids}
+    for chunk in sql_in_chunks(group_ids):
+        markers = ', '.join('?' for _ in chunk)
+        marks_query = f"""
+            SELECT ZTGPID as groupId, MAX(ZTSEQ) as lastSequence
+            FROM {SLTK_LIBRARY}.SLTKTRN
+            WHERE ZTGPID IN ({markers}) AND ZTSYST = 'E'
+            GROUP BY ZTGPID
+        """
+        for row in query_db(marks_query, chunk, name='error_marks'):
+            marks[row.groupId] = row.lastSequence or 0
+    return marks
+
+def get_new_errors(marks, limit=None):
+    """
+    Errors appended after a ZTSEQ high-water mark, for several groups at once
+
+    marks maps groupId -> last reported ZTSEQ. Only failed transactions above
+    each group's mark are read, so the cost follows the number of new errors
+    rather than the group's total. At most limit (ERROR_EVENT_MAX_ERRORS)
+    failed transactions per group are returned, lowest ZTSEQ first, so a
+    mass failure is spread over several polls. Returns groupId -> formatted
+    errors.
+    """
+    limit = limit or ERROR_EVENT_MAX_ERRORS
+    new_errors = {}
+    for chunk in sql_in_chunks(list(marks)):
+        conditions = ' OR '.join('(ZTGPID = ? AND ZTSEQ > ?)' for _ in chunk)
+        params = [value for group_id in chunk for value in (group_id, marks[group_id])]
+        # One statement covers the whole chunk, so the per group cap is a
+        # ROW_NUMBER() filter rather than FETCH FIRST
+        new_errors_query = f"""
+            SELECT
+                t.ZTGPID as groupId,
+                t.ZTTKEN as token,
+                t.ZTSEQ as sequence,
+                t.ZTSYST as status,
+                e.ZTMSGF as messageFile,
+                e.ZTMSGI as messageId,
+                e.ZTMSGD as messageData,
+                e.ZTMSGT as messageText
+            FROM (
+                SELECT ZTGPID, ZTTKEN, ZTSEQ, ZTSYST,
+                       ROW_NUMBER() OVER (PARTITION BY ZTGPID ORDER BY ZTSEQ) as errorNumber
+                FROM {SLTK_LIBRARY}.SLTKTRN
+                WHERE ZTSYST = 'E' AND ({conditions})
+            ) t
+            LEFT JOIN {SLTK_LIBRARY}.SLTKERR e ON t.ZTTKEN = e.ZTTKEN
+            WHERE t.errorNumber <= {limit}
+            ORDER BY t.ZTGPID, t.ZTSEQ
+        """
+        for err in query_db(new_errors_query, params, name='new_errors'):
+            new_errors.setdefault(err.groupId, []).append(format_error(err))
+    return new_errors
+
+# Resolution guidance per SLTK message ID
+ERROR_RESOLUTIONS = {
+    'XML0021': {
+        'issue': 'Object not found',
+        'fix': 'Check object name spelling in spreadsheet. Verify object exists in SLTKOBJ table.',
+        'sql': 'SELECT * FROM SLTKOBJ WHERE ZONAME = \'<object_name>\''
+    },
+    'XML0141': {
+        'issue': 'Profile handle error',
+        'fix': 'Verify user profile exists and has proper authority. Contact system administrator.',
+        'sql': None
+    },
+    'XML0161': {
+        'issue': 'No transactions found in spreadsheet',
+        'fix': 'Check that spreadsheet has data rows. Verify worksheet name matches configuration.',
+        'sql': 'SELECT * FROM SLTKSNU WHERE Z8LOAD = \'<load_name>\''
+    },
+    'XML0162': {
+        'issue': 'Worksheet not found',
+        'fix': 'Verify worksheet name in spreadsheet matches SLTKSNU configuration.',
+        'sql': 'SELECT * FROM SLTKSNU WHERE Z8LOAD = \'<load_name>\''
+    },
+    'XML0163': {
+        'issue': 'Worksheet processed (informational)',
+        'fix': 'No action needed - this is an informational message.',
         'sql': None
+    }
+}
+
+UNKNOWN_ERROR_RESOLUTION = {
+    'issue': 'Unknown error',
+    'fix': 'Review error message and contact support if needed.',
+    'sql': None
+}
+
+def load_error_catalog(path):
+    """Merge site-specific resolutions from a JSON file into ERROR_RESOLUTIONS"""
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+        for message_id, resolution in entries.items():
+            ERROR_RESOLUTIONS[message_id.strip()] = {
+                'issue': resolution.get('issue', UNKNOWN_ERROR_RESOLUTION['issue']),
+                'fix': resolution.get('fix', UNKNOWN_ERROR_RESOLUTION['fix']),
+                'sql': resolution.get('sql')
+            }
+        print(f"INFO: Loaded {len(entries)} error resolutions from {path}")
+    except Exception as e:
+        print(f"⚠️  WARNING: Cannot load error catalog {path}: {e}")
+
+load_error_catalog(ERROR_CATALOG_FILE)
+
+def get_error_resolution(message_id):
+    """Get resolution guidance for error codes"""
+    return ERROR_RESOLUTIONS.get(message_id, UNKNOWN_ERROR_RESOLUTION)
+
+def get_error_summary(group_id, samples=None):
+    """
+    Failed transactions of a SLTK group aggregated by message ID
+
+    One GROUP BY query returns counts and sequence range per message ID and
+    one windowed query the first few failed transactions of each, so the
+    result has one entry per distinct message however many rows failed.
+    """
+    samples = samples or ERROR_SUMMARY_SAMPLES
+    failed = f"""
+        FROM {SLTK_LIBRARY}.SLTKTRN t
+        LEFT JOIN {SLTK_LIBRARY}.SLTKERR e ON t.ZTTKEN = e.ZTTKEN
+        WHERE t.ZTGPID = ? AND t.ZTSYST = 'E'
+    """
+
+    summary_query = f"""
+        SELECT
+            e.ZTMSGI as messageId,
+            MAX(e.ZTMSGF) as messageFile,
+            MAX(e.ZTMSGT) as messageText,
+            COUNT(*) as occurrences,
+            COUNT(DISTINCT t.ZTTKEN) as transactions,
+            MIN(t.ZTSEQ) as firstSequence,
+            MAX(t.ZTSEQ) as lastSequence,
+            (SELECT COUNT(*) FROM {SLTK_LIBRARY}.SLTKTRN
+             WHERE ZTGPID = ? AND ZTSYST = 'E') as failedTransactions
+        {failed}
+        GROUP BY e.ZTMSGI
+        ORDER BY occurrences DESC
+    """
+
+    samples_query = f"""
+        SELECT messageId, token, sequence, messageData
+        FROM (
+            SELECT
+                e.ZTMSGI as messageId,
+                t.ZTTKEN as token,
+                t.ZTSEQ as sequence,
+                e.ZTMSGD as messageData,
+                ROW_NUMBER() OVER (PARTITION BY e.ZTMSGI ORDER BY t.ZTSEQ) as sampleNumber
+            {failed}
+        ) s
+        WHERE sampleNumber <= ?
+        ORDER BY sequence
+    """
+
+    try:
+        rows = query_db(summary_query, [group_id, group_id], name='error_summary')
+        sample_rows = query_db(samples_query, [group_id, samples], name='error_samples')
+    except Exception as e:
+        print(f"ERROR: get_error_summary failed: {e}")
+        raise
+
+    samples_by_message = {}
+    for row in sample_rows:
+        samples_by_message.setdefault(row.messageId, []).append({
+            'token': row.token,
+            'sequence': row.sequence,
+            'messageData': row.messageData
+        })
+
+    messages = []
+    for row in rows:
+        messages.append({
+            'messageId': row.messageId,
+            'messageFile': row.messageFile,
+            'messageText': row.messageText,
+            'occurrences': row.occurrences,
+            'transactions': row.transactions,
+            'firstSequence': row.firstSequence,
+            'lastSequence': row.lastSequence,
+            'samples': samples_by_message.get(row.messageId, []),
+            'resolution': get_error_resolution(row.messageId)
+        })
+
+    return {
+        'groupId': group_id,
+        'failedTransactions': rows[0].failedTransactions if rows else 0,
+        'distinctMessages': len(messages),
+        'messages': messages
+    }
+
+def build_history_query(user=None, status=None, from_date=None, to_date=None, after=None, limit=None):
+    """
+    SQL and params for SLTKGRP history, newest first
+
+    from_date/to_date are YYYYMMDD numbers (see date_arg); after is a
+    decoded keyset cursor (changeDate, changeTime, groupId); without limit
+    every matching row is returned.
+    """
+    where_conditions = []
+    params = []
+
+    if user:
+        where_conditions.append('ZGUSER = ?')
+        params.append(user)
+
+    if status:
+        where_conditions.append('ZGGPST = ?')
+        params.append(status)
+
+    if from_date:
+        where_conditions.append('ZGCHDT >= ?')
+        params.append(int(from_date))
+
+    if to_date:
+        where_conditions.append('ZGCHDT <= ?')
+        params.append(int(to_date))
+
+    if after:
+        after_date, after_time, after_group = after
+        where_conditions.append(
+            '(ZGCHDT < ? OR (ZGCHDT = ? AND ZGCHTM < ?) '
+            'OR (ZGCHDT = ? AND ZGCHTM = ? AND ZGGPID < ?))'
+        )
+        params.extend([after_date, after_date, after_time, after_date, after_time, after_group])
+
+    where_clause = 'WHERE ' + ' AND '.join(where_conditions) if where_conditions else ''
+    fetch_clause = f"FETCH FIRST {fetch_first_rows(limit)} ROWS ONLY" if limit else ''
+
+    history_query = f"""
+        SELECT
+            ZGGPID as groupId,
+            ZGGPDS as description,
+            ZGGPST as status,
+            ZGCHDT as changeDate,
+            ZGCHTM as changeTime,
+            ZGUSER as user
+        FROM {SLTK_LIBRARY}.SLTKGRP
+        {where_clause}
+        ORDER BY ZGCHDT DESC, ZGCHTM DESC, ZGGPID DESC
+        {fetch_clause}
+    """
+    return history_query, params
+
+def format_history_record(record):
+    return {
+        'groupId': record.groupId,
+        'description': record.description,
+        'status': record.status,
+        'statusText': get_status_text(record.status),
+        'changeDate': record.changeDate,
+        'changeTime': record.changeTime,
+        'user': record.user
+    }
+
+def encode_history_cursor(record):
+    """Opaque keyset cursor for the history row after which the next page starts"""
+    key = [int(record.changeDate), int(record.changeTime), record.groupId]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    """Decode a cursor from encode_history_cursor; raises ValueError if malformed"""
+    try:
+        change_date, change_time, group_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(change_date), int(change_time), str(group_id)
+    except Exception:
+        raise ValueError(f"Invalid history cursor: {cursor}")
+
+# --- Exports ---
+
+HISTORY_EXPORT_COLUMNS = ('groupId', 'description', 'status', 'statusText', 'changeDate', 'changeTime', 'user')
+ERROR_EXPORT_COLUMNS = ('token', 'sequence', 'status', 'messageFile', 'messageId', 'messageData', 'messageText',
+                        'issue', 'fix')
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def export_history_rows(user=None, status=None, from_date=None, to_date=None):
+    """Every matching history row, read from the database in batches (filters checked up front)"""
+    history_query, params = build_history_query(user, status, from_date, to_date)
+    records = map(format_history_record, iter_query(history_query, params, name='history_export'))
+    return ([record[column] for column in HISTORY_EXPORT_COLUMNS] for record in records)
+
+def export_error_rows(group_id):
+    """Every error line of a group with its resolution, read in batches"""
+    for error in iter_errors(group_id):
+        resolution = error['resolution']
+        yield [error[column] for column in ERROR_EXPORT_COLUMNS[:-2]] + [resolution['issue'], resolution['fix']]
+
+def stream_csv(columns, rows):
+    """Generate CSV text, one piece per QUERY_FETCH_BATCH_SIZE rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    try:
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % QUERY_FETCH_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        # Headers are already sent - mark the file as incomplete
+        print(f"ERROR: CSV export failed: {e}")
+        writer.writerow(['ERROR', f"Export incomplete: {e}"])
+    yield buffer.getvalue()
+
+def write_xlsx(columns, rows, title):
+    """
+    Write rows to a write-only workbook in EXPORT_DIR and return its path
+
+    Write-only worksheets go to disk row by row, so memory does not grow
+    with the export size.
+    """
+    make_private_dir(EXPORT_DIR)
+    fd, path = tempfile.mkstemp(suffix='.xlsx', dir=EXPORT_DIR)
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title)
+        sheet.append(list(columns))
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+    except Exception:
+        remove_quietly(path)
+        raise
+    return path
+
+def stream_file_once(path, chunk_size=None):
+    """Yield a file in chunks and delete it when the response is done (or aborted)"""
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+    finally:
+        remove_quietly(path)
+
+def export_response(export_format, columns, rows, filename, title):
+    """CSV streamed as rows are fetched, or an XLSX file removed once sent"""
+    if export_format == 'xlsx':
+        path = write_xlsx(columns, rows, title)
+        return Response(
+            stream_file_once(path),
+            mimetype=XLSX_MIMETYPE,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}.xlsx"',
+                'Content-Length': str(os.path.getsize(path))
+            }
+        )
+
+    return Response(
+        stream_with_context(stream_csv(columns, rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'}
+    )
+
+def export_format_error(export_format):
+    """Error response for an unusable ?format=, or None"""
+    if export_format not in ('csv', 'xlsx'):
+        return jsonify({
+            "success": False,
+            "error": "Invalid format",
+            "message": f"Unsupported export format '{export_format}' - use csv or xlsx"
+        }), 400
+    if export_format == 'xlsx' and not OPENPYXL_AVAILABLE:
+        return jsonify({
+            "success": False,
+            "error": "XLSX export not available",
+            "message": "openpyxl is not installed - use format=csv"
+        }), 503
+    return None
+
+# --- Stale Fallback ---
+
+class StaleResultCache:
+    """
+    Last good result per request key, served while DB2 is unavailable
+
+    Keeps up to max_size results (least recently stored evicted); results
+    fetched more than max_age seconds ago are not returned.
+    """
+
+    def __init__(self, max_size, max_age):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._results = OrderedDict()  # key -> (result, fetched_at)
+        self._lock = threading.Lock()
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = (result, time.time())
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def get(self, key):
+        """(result, fetched_at) for key, or None"""
+        with self._lock:
+            entry = self._results.get(key)
+        if entry and time.time() - entry[1] <= self.max_age:
+            return entry
+        return None
+
+history_results = StaleResultCache(STALE_HISTORY_CACHE_SIZE, STALE_MAX_AGE)
+
+def stale_fields(fetched_at):
+    """Response fields marking a result as served from before a DB2 outage"""
+    return {"stale": True, "asOf": datetime.fromtimestamp(fetched_at).isoformat()}
+
+def database_unavailable_response(e):
+    """503 for a request that needed DB2 while it is unreachable"""
+    response = jsonify({
+        "success": False,
+        "error": "Database unavailable",
+        "message": str(e)
     })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(DB_BREAKER_PROBE_INTERVAL)
+    return response
+
+# --- Query Parameters ---
+
+class InvalidParameterError(ValueError):
+    """Raised for a query parameter that cannot be used (answered with 400)"""
+
+def int_arg(name, default=None):
+    """Integer query parameter, default when missing or empty"""
+    value = (request.args.get(name) or '').strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise InvalidParameterError(f"{name} must be an integer, got '{value}'")
+
+def date_arg(name):
+    """Date query parameter (YYYY-MM-DD or YYYYMMDD) as the YYYYMMDD number ZGCHDT holds"""
+    value = (request.args.get(name) or '').strip()
+    if not value:
+        return None
+    for date_format in ('%Y-%m-%d', '%Y%m%d'):
+        try:
+            return int(datetime.strptime(value, date_format).strftime('%Y%m%d'))
+        except ValueError:
+            pass
+    raise InvalidParameterError(f"{name} must be a date (YYYY-MM-DD or YYYYMMDD), got '{value}'")
+
+def invalid_parameter_response(e):
+    return jsonify({
+        "success": False,
+        "error": "Invalid parameter",
+        "message": str(e)
+    }), 400
 
 # --- API Endpoints ---
 
@@ -352,96 +2997,355 @@ def health_check():
         "status": "running",
         "message": "SLTK Monitor API is operational",
         "timestamp": datetime.now().isoformat(),
+        "database": db_breaker.stats(),
         "endpoints": [
             "/",
+            "/metrics",
             "/api/loads",
+            "/api/loads/refresh",
+            "/api/dropbox/backlog",
             "/upload/excel",
+            "/upload/chunked",
+            "/upload/bulk",
+            "/api/uploads/<jobId>",
+            "/api/status?ids=<groupId,...>",
             "/api/status/<groupId>",
             "/api/errors/<groupId>",
-            "/api/history"
+            "/api/errors/<groupId>/summary",
+            "/api/errors/<groupId>/export",
+            "/api/history",
+            "/api/history/export"
         ]
     }), 200
 
-@app.route('/api/loads', methods=['GET'])
-def get_loads():
-    """Get list of available SLTK Load IDs"""
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for this process"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/loads', methods=['GET'])
+def get_loads():
+    """Get list of available SLTK Load IDs"""
+    try:
+        loads, etag, stale_since = load_catalog.get()
+
+        # Unchanged catalog - let the client reuse its copy
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            payload = {
+                "status": "success",
+                "loads": loads,
+                "count": len(loads)
+            }
+            if stale_since is not None:
+                STALE_RESPONSES.inc(1, 'loads')
+                payload.update(stale_fields(stale_since))
+            response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        print(f"ERROR: Failed to get loads: {e}")
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "loads": []
+        }), 500
+
+@app.route('/api/loads/refresh', methods=['POST'])
+def refresh_loads():
+    """Drop the cached load catalog and rebuild it"""
+    load_catalog.invalidate()
+    return get_loads()
+
+@app.route('/api/dropbox/backlog', methods=['GET'])
+def get_dropbox_backlog():
+    """List dropbox folders that still hold files waiting for SLTKDRP"""
+    try:
+        backlog = dropbox_index.backlog()
+        return jsonify({
+            "success": True,
+            "data": {
+                "lastScan": dropbox_index.last_scan,
+                "folderCount": len(backlog),
+                "pendingFiles": sum(folder['pendingFiles'] for folder in backlog),
+                "folders": backlog
+            }
+        }), 200
+    except Exception as e:
+        print(f"ERROR: get_dropbox_backlog endpoint failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+
+@app.route('/upload/excel', methods=['POST'])
+def upload_excel_file():
+    """Upload Excel file to IFS folder for SLTK processing"""
+    try:
+        if 'excel_file' not in request.files:
+            return jsonify({"status": "error", "message": "No file part found in request"}), 400
+
+        file = request.files['excel_file']
+
+        if file.filename == '':
+            return jsonify({"status": "error", "message": "No file selected for uploading"}), 400
+
+        filename = os.path.basename(file.filename)
+
+        # Get Load ID from request (optional)
+        load_id = request.form.get('load_id', None)
+        force = request.form.get('force', '').lower() == 'true'
+        validate = request.form.get('validate', '').lower() != 'false'
+
+        spool_path, size, sha256 = spool_upload(file.stream, filename)
+        payload, status_code = deliver_upload(spool_path, size, sha256, filename, load_id, force,
+                                              None if validate else False)
+        return jsonify(payload), status_code
+
+    except Exception as e:
+        print(f"ERROR: upload_excel_file failed: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/api/uploads/<job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    """Get the processing state of an upload job"""
+    payload = find_upload_job(job_id)
+
+    if not payload:
+        return jsonify({
+            "success": False,
+            "error": "Job not found",
+            "message": f"Upload job {job_id} does not exist"
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "data": payload
+    }), 200
+
+@app.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """Upload several Excel files (or zip archives of them) and queue them for the upload workers"""
+    try:
+        files = request.files.getlist('excel_files') + request.files.getlist('excel_file')
+        if not files:
+            return jsonify({"status": "error", "message": "No files found in request (use excel_files)"}), 400
+
+        load_id = request.form.get('load_id', None)
+        force = request.form.get('force', '').lower() == 'true'
+        validate = request.form.get('validate', '').lower() != 'false'
+
+        try:
+            entries = spool_bulk_upload(files)
+        except ValueError as e:
+            UPLOADS.inc(1, 'rejected')
+            return jsonify({"status": "error", "message": str(e)}), 413
+
+        results = process_bulk_upload(entries, load_id, force, None if validate else False)
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        print(f"INFO: Bulk upload of {len(results)} files: {counts}")
+
+        queued = counts.get('queued', 0)
+        failed = counts.get('failed', 0) + counts.get('rejected', 0) + counts.get('refused', 0)
+        if counts.get('refused') and not queued:
+            code = 503
+        else:
+            code = 202 if not failed else 207
+        return jsonify({
+            "status": "success" if not failed else ("error" if code == 503 else "partial"),
+            "message": f"{queued} of {len(results)} files queued for processing. SLTKDRP will process them once they are dropped.",
+            "summary": counts,
+            "files": results,
+            "next_steps": "Track each file using /api/uploads/<jobId> or the 'watch-upload' WebSocket event"
+        }), code
+    except Exception as e:
+        print(f"ERROR: upload_bulk failed: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def public_upload_session(session):
+    return {
+        "upload_id": session['uploadId'],
+        "filename": session['filename'],
+        "size": session['size'],
+        "offset": session['offset'],
+        "chunk_size": UPLOAD_CHUNK_SIZE
+    }
+
+@app.route('/upload/chunked', methods=['POST'])
+def start_chunked_upload():
+    """Start a resumable upload; the file is then sent with PUT /upload/chunked/<uploadId>"""
     try:
-        # Try to get from SLTKLOD table
-        loads = get_available_loads()
+        params = request.get_json(silent=True) or request.form
+        filename = os.path.basename(params.get('filename') or '')
+        load_id = params.get('load_id') or None
+        sha256 = (params.get('sha256') or '').lower() or None
+        force = str(params.get('force', '')).lower() == 'true'
+        try:
+            size = int(params.get('size'))
+        except (TypeError, ValueError):
+            size = -1
 
-        # If database query fails, try scanning IFS folders
-        if not loads:
-            folders = scan_dropbox_folders()
-            loads = [{"load_id": f, "description": f"Dropbox folder: {f}"} for f in folders]
+        if not filename or size <= 0:
+            return jsonify({"status": "error", "message": "filename and a positive size are required"}), 400
 
-        return jsonify({
-            "status": "success",
-            "loads": loads,
-            "count": len(loads)
-        }), 200
+        # A client that sends the hash up front skips transferring a file that was already dropped
+        if sha256 and UPLOAD_DEDUPLICATION and not force:
+            dropbox_folder = get_dropbox_folder(load_id=load_id, filename=filename, create=False)
+            previous = read_upload_hash_index(dropbox_folder).get(sha256)
+            if previous:
+                return jsonify(duplicate_upload_response(filename, load_id, sha256, previous)), 200
+
+        session = create_upload_session(filename, size, load_id, sha256, force)
+        session['offset'] = 0
+        print(f"INFO: Chunked upload {session['uploadId']} started for {filename} ({size} bytes)")
+        return jsonify(dict(public_upload_session(session), status="success")), 201
     except Exception as e:
-        print(f"ERROR: Failed to get loads: {e}")
-        return jsonify({
-            "status": "error",
-            "message": str(e),
-            "loads": []
-        }), 500
+        print(f"ERROR: start_chunked_upload failed: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/upload/excel', methods=['POST'])
-def upload_excel_file():
-    """Upload Excel file to IFS folder for SLTK processing"""
+@app.route('/upload/chunked/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
+    """Bytes received so far - where an interrupted client resumes"""
+    session = find_upload_session(upload_id)
+    if not session:
+        return jsonify({"status": "error", "message": f"Upload {upload_id} does not exist or has expired"}), 404
+    return jsonify(dict(public_upload_session(session), status="success")), 200
+
+@app.route('/upload/chunked/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """Append the request body at ?offset= to a chunked upload"""
     try:
-        if 'excel_file' not in request.files:
-            return jsonify({"status": "error", "message": "No file part found in request"}), 400
+        session = find_upload_session(upload_id)
+        if not session:
+            return jsonify({"status": "error", "message": f"Upload {upload_id} does not exist or has expired"}), 404
 
-        file = request.files['excel_file']
+        try:
+            offset = int(request.args.get('offset', ''))
+        except ValueError:
+            return jsonify({"status": "error", "message": "offset query parameter is required"}), 400
 
-        if file.filename == '':
-            return jsonify({"status": "error", "message": "No file selected for uploading"}), 400
+        try:
+            session['offset'] = append_upload_chunk(session, offset, request.stream)
+        except ValueError as e:
+            # Tells the client where to resume from
+            session = find_upload_session(upload_id)
+            return jsonify(dict(public_upload_session(session), status="error", message=str(e))), 409
 
-        # Get Load ID from request (optional)
-        load_id = request.form.get('load_id', None)
+        return jsonify(dict(public_upload_session(session), status="success")), 200
+    except Exception as e:
+        print(f"ERROR: put_upload_chunk failed: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/upload/chunked/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Verify a fully received chunked upload and drop it like /upload/excel"""
+    try:
+        session = find_upload_session(upload_id)
+        if not session:
+            return jsonify({"status": "error", "message": f"Upload {upload_id} does not exist or has expired"}), 404
 
-        # Dynamically determine dropbox folder
-        dropbox_folder = get_dropbox_folder(load_id=load_id, filename=file.filename)
+        if session['offset'] != session['size']:
+            return jsonify(dict(public_upload_session(session), status="error",
+                                message=f"Received {session['offset']} of {session['size']} bytes")), 409
 
-        print(f"INFO: Using dropbox folder: {dropbox_folder}")
-        print(f"INFO: Load ID: {load_id if load_id else 'Auto-detected from filename'}")
+        _, data_path = upload_session_paths(upload_id)
+        sha256 = run_blocking(hash_file, data_path)
+        if session['sha256'] and session['sha256'] != sha256:
+            remove_upload_session(upload_id)
+            return jsonify({
+                "status": "error",
+                "message": "SHA-256 of the received file does not match - upload it again",
+                "sha256": sha256
+            }), 422
 
-        # Create folder if needed
-        try:
-            os.makedirs(dropbox_folder, exist_ok=True)
-            print(f"SUCCESS: Directory verified: {dropbox_folder}")
-        except Exception as folder_error:
-            return jsonify({"status": "error", "message": f"Cannot create folder: {folder_error}"}), 500
+        # The data file becomes the spool file handed to deliver_upload (openpyxl needs the extension)
+        extension = os.path.splitext(session['filename'])[1] or '.xlsx'
+        spool_path = os.path.join(UPLOAD_STAGING_DIR, f"{upload_id}{extension}")
+        os.replace(data_path, spool_path)
+        remove_upload_session(upload_id)
+        print(f"INFO: Chunked upload {upload_id} complete ({session['size']} bytes)")
+        payload, status_code = deliver_upload(spool_path, session['size'], sha256, session['filename'],
+                                              session['loadId'], session['force'])
+        return jsonify(payload), status_code
+    except Exception as e:
+        print(f"ERROR: complete_chunked_upload failed: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        # Save file to IFS folder
-        output_path = os.path.join(dropbox_folder, file.filename)
+@app.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """Discard a chunked upload"""
+    if not find_upload_session(upload_id):
+        return jsonify({"status": "error", "message": f"Upload {upload_id} does not exist or has expired"}), 404
+    remove_upload_session(upload_id)
+    return jsonify({"status": "success", "message": f"Upload {upload_id} discarded"}), 200
 
-        if PANDAS_AVAILABLE:
-            # Use pandas to read and add timestamp
-            df = pd.read_excel(file.stream, engine='openpyxl')
-            df['IBMi_Process_Timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            df.to_excel(output_path, index=False, engine='openpyxl')
-            print(f"✅ SUCCESS: File processed with pandas and saved to {output_path}")
-        else:
-            # Fallback: Just save the file as-is
-            file.save(output_path)
-            print(f"✅ SUCCESS: File saved to {output_path} (without pandas processing)")
-            print(f"⚠️  WARNING: Timestamp column not added (pandas not available)")
+@app.route('/api/status', methods=['GET'])
+def get_statuses():
+    """Get current status of several SLTK groups (?ids=G1,G2,...)"""
+    try:
+        if not PYODBC_AVAILABLE:
+            return jsonify({
+                "success": False,
+                "error": "Database not available",
+                "message": "pyodbc is not installed - database features are disabled"
+            }), 503
 
-        print(f"INFO: SLTKDRP will process this file automatically")
+        group_ids = parse_group_ids(request.args.get('ids', ''))
+        if not group_ids:
+            return jsonify({
+                "success": False,
+                "error": "Invalid parameter",
+                "message": "ids must list at least one group ID (comma-separated)"
+            }), 400
+        if len(group_ids) > STATUS_BATCH_MAX_GROUPS:
+            return jsonify({
+                "success": False,
+                "error": "Invalid parameter",
+                "message": f"At most {STATUS_BATCH_MAX_GROUPS} group IDs per request"
+            }), 400
+
+        try:
+            statuses = get_cached_group_statuses(group_ids)
+        except DatabaseUnavailableError as e:
+            stale = status_cache.get_stale(group_ids, STALE_MAX_AGE) if STALE_FALLBACK else {}
+            if not stale:
+                raise
+            print(f"WARNING: Serving stale statuses for {len(stale)} of {len(group_ids)} groups: {e}")
+            STALE_RESPONSES.inc(1, 'status')
+            return jsonify({
+                "success": True,
+                "data": {
+                    "count": len(stale),
+                    "statuses": [stale[g][0] for g in group_ids if g in stale],
+                    "notFound": [],
+                    "unavailable": [g for g in group_ids if g not in stale]
+                },
+                **stale_fields(min(fetched_at for _, fetched_at in stale.values()))
+            }), 200
 
         return jsonify({
-            "status": "success",
-            "message": f"File '{file.filename}' uploaded successfully. SLTKDRP will process it automatically.",
-            "server_path": output_path,
-            "next_steps": "Monitor the upload using /api/status/<groupId> endpoint"
+            "success": True,
+            "data": {
+                "count": len(statuses),
+                "statuses": [statuses[g] for g in group_ids if g in statuses],
+                "notFound": [g for g in group_ids if g not in statuses]
+            }
         }), 200
-
+    except DatabaseUnavailableError as e:
+        print(f"ERROR: get_statuses endpoint failed: {e}")
+        return database_unavailable_response(e)
     except Exception as e:
-        print(f"ERROR: upload_excel_file failed: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        print(f"ERROR: get_statuses endpoint failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
 
 @app.route('/api/status/<group_id>', methods=['GET'])
 def get_status(group_id):
@@ -454,7 +3358,20 @@ def get_status(group_id):
                 "message": "pyodbc is not installed - database features are disabled"
             }), 503
 
-        status = get_group_status(group_id)
+        try:
+            status = get_cached_group_status(group_id)
+        except DatabaseUnavailableError as e:
+            group_id = str(group_id).strip()
+            stale = status_cache.get_stale([group_id], STALE_MAX_AGE).get(group_id) if STALE_FALLBACK else None
+            if not stale:
+                raise
+            print(f"WARNING: Serving stale status of group {group_id}: {e}")
+            STALE_RESPONSES.inc(1, 'status')
+            return jsonify({
+                "success": True,
+                "data": stale[0],
+                **stale_fields(stale[1])
+            }), 200
 
         if not status:
             return jsonify({
@@ -467,6 +3384,9 @@ def get_status(group_id):
             "success": True,
             "data": status
         }), 200
+    except DatabaseUnavailableError as e:
+        print(f"ERROR: get_status endpoint failed: {e}")
+        return database_unavailable_response(e)
     except Exception as e:
         print(f"ERROR: get_status endpoint failed: {e}")
         return jsonify({
@@ -475,6 +3395,16 @@ def get_status(group_id):
             "message": str(e)
         }), 500
 
+def stream_errors_ndjson(group_id, after_seq=None):
+    """Generate one JSON document per error line, reading rows in batches"""
+    try:
+        for error in iter_errors(group_id, after_seq):
+            yield json.dumps(error, default=str) + '\n'
+    except Exception as e:
+        # Headers are already sent - report the failure in-band
+        print(f"ERROR: error stream for {group_id} failed: {e}")
+        yield json.dumps({'error': 'Internal server error', 'message': str(e)}) + '\n'
+
 @app.route('/api/errors/<group_id>', methods=['GET'])
 def get_errors_endpoint(group_id):
     """Get errors for a SLTK group"""
@@ -486,16 +3416,38 @@ def get_errors_endpoint(group_id):
                 "message": "pyodbc is not installed - database features are disabled"
             }), 503
 
-        errors = get_errors(group_id)
+        after_seq = int_arg('afterSeq')
+        limit = int_arg('limit')
+        limit = max(1, min(limit, ERRORS_MAX_PAGE_SIZE)) if limit is not None else None
+
+        wants_ndjson = (
+            request.args.get('format') == 'ndjson' or
+            request.accept_mimetypes.best == 'application/x-ndjson'
+        )
+        if wants_ndjson:
+            return Response(
+                stream_with_context(stream_errors_ndjson(group_id, after_seq)),
+                mimetype='application/x-ndjson'
+            )
+
+        errors = get_errors(group_id, after_seq=after_seq, limit=limit)
+
+        # A full page means there may be more failed transactions after it
+        next_seq = None
+        if limit and errors and len({err['sequence'] for err in errors}) >= limit:
+            next_seq = errors[-1]['sequence']
 
         return jsonify({
             "success": True,
             "data": {
                 "groupId": group_id,
                 "errorCount": len(errors),
-                "errors": errors
+                "errors": errors,
+                "nextSeq": next_seq
             }
         }), 200
+    except InvalidParameterError as e:
+        return invalid_parameter_response(e)
     except Exception as e:
         print(f"ERROR: get_errors endpoint failed: {e}")
         return jsonify({
@@ -504,9 +3456,9 @@ def get_errors_endpoint(group_id):
             "message": str(e)
         }), 500
 
-@app.route('/api/history', methods=['GET'])
-def get_history():
-    """Get SLTK upload history"""
+@app.route('/api/errors/<group_id>/summary', methods=['GET'])
+def get_error_summary_endpoint(group_id):
+    """Get a SLTK group's errors aggregated by message ID with resolution guidance"""
     try:
         if not PYODBC_AVAILABLE:
             return jsonify({
@@ -515,70 +3467,123 @@ def get_history():
                 "message": "pyodbc is not installed - database features are disabled"
             }), 503
 
-        user = request.args.get('user')
-        status = request.args.get('status')
-        from_date = request.args.get('fromDate')
-        to_date = request.args.get('toDate')
-        limit = int(request.args.get('limit', 50))
+        samples = int_arg('samples')
+        samples = max(1, min(samples, 20)) if samples is not None else None
+
+        return jsonify({
+            "success": True,
+            "data": get_error_summary(group_id.strip(), samples)
+        }), 200
+    except InvalidParameterError as e:
+        return invalid_parameter_response(e)
+    except Exception as e:
+        print(f"ERROR: get_error_summary endpoint failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
 
-        # Build query
-        where_conditions = []
-        params = []
+@app.route('/api/errors/<group_id>/export', methods=['GET'])
+def export_errors(group_id):
+    """Export every error of a SLTK group as CSV or XLSX"""
+    try:
+        if not PYODBC_AVAILABLE:
+            return jsonify({
+                "success": False,
+                "error": "Database not available",
+                "message": "pyodbc is not installed - database features are disabled"
+            }), 503
 
-        if user:
-            where_conditions.append('ZGUSER = ?')
-            params.append(user)
+        export_format = request.args.get('format', 'csv').lower()
+        invalid = export_format_error(export_format)
+        if invalid:
+            return invalid
 
-        if status:
-            where_conditions.append('ZGGPST = ?')
-            params.append(status)
+        group_id = group_id.strip()
+        safe_id = ''.join(c for c in group_id if c.isalnum())
+        print(f"INFO: Exporting errors of {group_id} as {export_format}")
+        return export_response(export_format, ERROR_EXPORT_COLUMNS, export_error_rows(group_id),
+                               f"sltk-errors-{safe_id}", 'Errors')
+    except Exception as e:
+        print(f"ERROR: export_errors endpoint failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
 
-        if from_date:
-            where_conditions.append('ZGCHDT >= ?')
-            params.append(int(from_date))
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Get SLTK upload history"""
+    try:
+        if not PYODBC_AVAILABLE:
+            return jsonify({
+                "success": False,
+                "error": "Database not available",
+                "message": "pyodbc is not installed - database features are disabled"
+            }), 503
 
-        if to_date:
-            where_conditions.append('ZGCHDT <= ?')
-            params.append(int(to_date))
+        user = request.args.get('user')
+        status = request.args.get('status')
+        from_date = date_arg('fromDate')
+        to_date = date_arg('toDate')
+        limit = int_arg('limit', HISTORY_DEFAULT_PAGE_SIZE)
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
 
-        where_clause = 'WHERE ' + ' AND '.join(where_conditions) if where_conditions else ''
+        after = None
+        if cursor:
+            # Keyset: continue strictly after the last row of the previous page
+            try:
+                after = decode_history_cursor(cursor)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": "Invalid cursor",
+                    "message": str(e)
+                }), 400
 
-        history_query = f"""
-            SELECT
-                ZGGPID as groupId,
-                ZGGPDS as description,
-                ZGGPST as status,
-                ZGCHDT as changeDate,
-                ZGCHTM as changeTime,
-                ZGUSER as user
-            FROM {SLTK_LIBRARY}.SLTKGRP
-            {where_clause}
-            ORDER BY ZGCHDT DESC, ZGCHTM DESC
-            FETCH FIRST {limit} ROWS ONLY
-        """
+        # One extra row tells whether another page exists
+        history_query, params = build_history_query(user, status, from_date, to_date, after, limit + 1)
+        result_key = (user, status, from_date, to_date, cursor, limit)
 
-        history = query_db(history_query, params if params else None)
+        try:
+            history = query_db(history_query, params if params else None, name='history')[:limit + 1]
+        except DatabaseUnavailableError as e:
+            stale = history_results.get(result_key) if STALE_FALLBACK else None
+            if not stale:
+                raise
+            print(f"WARNING: Serving stale history: {e}")
+            STALE_RESPONSES.inc(1, 'history')
+            return jsonify({
+                "success": True,
+                "data": stale[0],
+                **stale_fields(stale[1])
+            }), 200
+        next_cursor = encode_history_cursor(history[limit - 1]) if len(history) > limit else None
+        history = history[:limit]
 
         # Format results
-        formatted_history = []
-        for record in history:
-            formatted_history.append({
-                'groupId': record['groupId'].strip(),
-                'description': record['description'].strip(),
-                'status': record['status'].strip(),
-                'statusText': get_status_text(record['status']),
-                'changeDate': record['changeDate'],
-                'changeTime': record['changeTime'],
-                'user': record['user'].strip()
-            })
+        formatted_history = [format_history_record(record) for record in history]
+
+        data = {
+            "count": len(formatted_history),
+            "history": formatted_history,
+            "next": next_cursor
+        }
+        if STALE_FALLBACK:
+            history_results.put(result_key, data)
 
         return jsonify({
             "success": True,
-            "data": {
-                "count": len(formatted_history),
-                "history": formatted_history
-            }
+            "data": data
         }), 200
+    except DatabaseUnavailableError as e:
+        print(f"ERROR: get_history endpoint failed: {e}")
+        return database_unavailable_response(e)
+    except InvalidParameterError as e:
+        return invalid_parameter_response(e)
     except Exception as e:
         print(f"ERROR: get_history endpoint failed: {e}")
         return jsonify({
@@ -587,106 +3592,689 @@ def get_history():
             "message": str(e)
         }), 500
 
+@app.route('/api/history/export', methods=['GET'])
+def export_history():
+    """Export SLTK upload history as CSV or XLSX (same filters as /api/history, no limit)"""
+    try:
+        if not PYODBC_AVAILABLE:
+            return jsonify({
+                "success": False,
+                "error": "Database not available",
+                "message": "pyodbc is not installed - database features are disabled"
+            }), 503
+
+        export_format = request.args.get('format', 'csv').lower()
+        invalid = export_format_error(export_format)
+        if invalid:
+            return invalid
+
+        rows = export_history_rows(
+            user=request.args.get('user'),
+            status=request.args.get('status'),
+            from_date=date_arg('fromDate'),
+            to_date=date_arg('toDate')
+        )
+        print(f"INFO: Exporting history as {export_format}")
+        return export_response(export_format, HISTORY_EXPORT_COLUMNS, rows,
+                               f"sltk-history-{datetime.now().strftime('%Y%m%d-%H%M%S')}", 'History')
+    except InvalidParameterError as e:
+        return invalid_parameter_response(e)
+    except Exception as e:
+        print(f"ERROR: export_history endpoint failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Internal server error",
+            "message": str(e)
+        }), 500
+
 # --- WebSocket Events ---
 
-def monitor_group(group_id):
-    """Background thread to monitor a SLTK group"""
-    print(f"INFO: Starting monitor for group {group_id}")
-    last_status = None
+class MonitorLeadership:
+    """
+    Cross-process leader election for group polling (multi-worker mode)
+
+    Every monitored group has a lock file in directory; the worker holding
+    its exclusive lock polls the group, the others keep their subscribers
+    in the room and receive the leader's events through the message queue.
+    The leader also stores each polled snapshot next to the lock so other
+    workers can hand new subscribers the same base its deltas apply to.
+    Locks are released by the OS when a worker dies; files of groups nobody
+    polled for MONITOR_STATE_RETENTION are deleted by prune().
+    """
+
+    PRUNE_INTERVAL = 600  # Seconds between prune() sweeps
+
+    def __init__(self, directory):
+        if fcntl is None:
+            raise RuntimeError("Multi-worker mode needs POSIX file locks (fcntl) - run with SLTK_WORKERS=1")
+        self.directory = directory
+        self._held = {}  # groupId -> open lock file
+        self._lock = threading.Lock()
+        self._pruned_at = 0
+        make_private_dir(os.path.dirname(directory))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, group_id, suffix):
+        return os.path.join(self.directory, group_id.encode('utf-8').hex() + suffix)
+
+    def _lock_file(self, path):
+        """Open and lock path without waiting; None when another worker holds it"""
+        while True:
+            lock_file = open(path, 'a')
+            try:
+                fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+            try:
+                current = os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                return lock_file
+            # prune() deleted the file while we were opening it - lock the new one
+            lock_file.close()
+
+    def acquire(self, group_id):
+        """Try to become the group's leader without waiting"""
+        with self._lock:
+            if group_id in self._held:
+                return True
+            lock_file = self._lock_file(self._path(group_id, '.lock'))
+            if lock_file is None:
+                return False
+            self._held[group_id] = lock_file
+            return True
+
+    def release(self, group_id):
+        with self._lock:
+            lock_file = self._held.pop(group_id, None)
+        if lock_file is not None:
+            # Closing the file drops the lock
+            lock_file.close()
+
+    def prune(self, retention=None):
+        """
+        Delete the files of groups not polled for retention seconds
+
+        A file is only deleted while its lock is held, and acquire() checks
+        that the file it locked is still in place, so a worker never leads
+        through a deleted lock file. Runs at most every PRUNE_INTERVAL.
+        """
+        now = time.time()
+        if now - self._pruned_at < self.PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        cutoff = now - (retention or MONITOR_STATE_RETENTION)
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.lock')]
+        except OSError:
+            return
+        for name in names:
+            lock_path = os.path.join(self.directory, name)
+            snapshot_path = lock_path[:-len('.lock')] + '.json'
+            try:
+                group_id = bytes.fromhex(name[:-len('.lock')]).decode('utf-8')
+                last_poll = os.path.getmtime(snapshot_path if os.path.exists(snapshot_path) else lock_path)
+            except (ValueError, OSError):
+                continue
+            if last_poll >= cutoff:
+                continue
+            with self._lock:
+                # POSIX locks belong to the process - never touch a group held here
+                if group_id in self._held:
+                    continue
+                lock_file = self._lock_file(lock_path)
+                if lock_file is None:
+                    continue
+                try:
+                    remove_quietly(snapshot_path)
+                    remove_quietly(lock_path)
+                finally:
+                    lock_file.close()
+
+    def led_elsewhere(self, group_id):
+        """True when another worker currently leads the group"""
+        with self._lock:
+            if group_id in self._held:
+                return False
+        if self.acquire(group_id):
+            self.release(group_id)
+            return False
+        return True
+
+    def save(self, group_id, snapshot, error_seq=None):
+        """Store the leader's latest (watermark, status) snapshot and error high-water mark"""
+        path = self._path(group_id, '.json')
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'watermark': snapshot[0], 'status': snapshot[1], 'errorSeq': error_seq,
+                       'savedAt': time.time()}, f, default=str)
+        os.replace(temp_path, path)
 
-    while group_id in active_monitors:
+    def load(self, group_id):
+        """The stored snapshot record, or None"""
         try:
-            status = get_group_status(group_id)
-
-            if not status:
-                socketio.emit('error', {
-                    'groupId': group_id,
-                    'message': 'Group not found'
-                }, room=group_id)
-                break
-
-            # Emit update if status changed
-            status_changed = (
-                not last_status or
-                last_status['status'] != status['status'] or
-                last_status['progress']['percentage'] != status['progress']['percentage']
-            )
+            with open(self._path(group_id, '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+monitor_leadership = MonitorLeadership(os.path.join(SHARED_STATE_DIR, 'monitors')) if WORKERS > 1 else None
+
+class GroupMonitor:
+    """Polling state for one monitored SLTK group"""
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self.last_status = None
+        self.watermark = None
+        self.interval = POLL_INTERVAL
+        self.next_poll = time.monotonic()
+        self.subscribers = set()  # Socket.IO sids watching this group
+        self.idle_since = None  # When the last subscriber left
+        self.leader = monitor_leadership is None  # Polls the group (multi-worker: holds its lock)
+        self.error_seq = None  # ZTSEQ high-water mark of errors already reported
+        self.error_count = 0  # Failed transactions counted when error_seq was last advanced
+        self.errors_pending = False  # Last error-added batch was capped - more follow on the next poll
+        self.created_at = time.time()
+
+    def follow(self):
+        """
+        Drop leadership state (multi-worker mode)
+
+        Another worker polls the group from now on, so the last snapshot,
+        watermark and error mark here go stale; a later takeover starts over
+        with a full status-update instead of deltas against them.
+        """
+        self.leader = False
+        self.last_status = None
+        self.watermark = None
+        self.error_seq = None
+        self.error_count = 0
+        self.errors_pending = False
+
+    def reschedule(self, moved):
+        """Poll again soon while progress moves, back off while idle or waiting"""
+        waiting = self.last_status and self.last_status['status'] in WAITING_STATUSES
+        if moved and not waiting:
+            self.interval = MIN_POLL_INTERVAL
+        else:
+            self.interval = min(self.interval * POLL_BACKOFF_FACTOR, MAX_POLL_INTERVAL)
+        self.next_poll = time.monotonic() + self.interval
+
+def ensure_monitor_scheduler():
+    """Start the shared monitor scheduler thread if it is not running"""
+    global monitor_scheduler_thread
 
-            if status_changed:
-                socketio.emit('status-update', status, room=group_id)
-                print(f"INFO: Status update emitted for {group_id}: {status['statusText']} - {status['progress']['percentage']}%")
+    with monitors_lock:
+        monitor_wakeup.set()
+        if monitor_scheduler_thread is None:
+            monitor_scheduler_thread = socketio.start_background_task(monitor_scheduler)
+            print("INFO: Started monitor scheduler thread")
+
+def monitor_scheduler():
+    """
+    Background thread that polls every monitored SLTK group
+
+    One thread serves all groups in active_monitors. Each group has its own
+    adaptive interval; every tick fetches the status of the groups that are
+    due with set-based queries and fans the results out to the Socket.IO
+    room of each group. The thread exits when there is nothing left to
+    monitor.
+    """
+    global monitor_scheduler_thread
 
-            # Stop monitoring if complete or error
-            if status['status'] in ['X', 'E', 'C']:
-                print(f"INFO: Group {group_id} finished with status {status['status']}")
-                socketio.emit('processing-complete', status, room=group_id)
-                break
+    while True:
+        with monitors_lock:
+            if not active_monitors:
+                monitor_scheduler_thread = None
+                print("INFO: Monitor scheduler stopped - no active monitors")
+                return
+            monitor_wakeup.clear()
+            now = time.monotonic()
+            evict_idle_monitors_locked(now)
+            if not active_monitors:
+                continue
+            # Groups nobody watches are not polled while in their grace period
+            watched = [m for m in active_monitors.values() if m.subscribers]
+            due = [m for m in watched if m.next_poll <= now]
+            if monitor_leadership is not None:
+                due = claim_due_monitors_locked(due, now)
+                watched = [m for m in active_monitors.values() if m.subscribers]
+            if not active_monitors:
+                continue
+            next_due = min(
+                [m.next_poll for m in watched] +
+                [m.idle_since + MONITOR_IDLE_GRACE for m in active_monitors.values() if not m.subscribers]
+            )
 
-            last_status = status
-            time.sleep(POLL_INTERVAL)
+        if not due:
+            # Sleep until the next group is due or subscriptions change
+            monitor_wakeup.wait(max(next_due - now, 0))
+            continue
 
+        try:
+            # Unchanged groups cost only the watermark lookup
+            snapshots = get_group_snapshots(
+                [m.group_id for m in due],
+                {m.group_id: (m.watermark, m.last_status) for m in due if m.last_status}
+            )
+            status_cache.put_many(snapshots)
+            new_errors = collect_new_errors(due, snapshots) if ERROR_EVENTS else {}
+            if monitor_leadership is not None:
+                # Stored before publishing so a subscriber joining on another
+                # worker never gets a base older than the deltas it receives
+                for monitor in due:
+                    snapshot = snapshots.get(monitor.group_id)
+                    if snapshot:
+                        monitor_leadership.save(monitor.group_id, snapshot, monitor.error_seq)
+        except DatabaseUnavailableError as e:
+            # Keep the groups and retry with back-off until DB2 answers again
+            print(f"WARNING: Monitor scheduler poll failed, retrying: {e}")
+            for monitor in due:
+                socket_emit('error', {
+                    'groupId': monitor.group_id,
+                    'message': 'Database unavailable - monitoring will resume when it recovers',
+                    'error': str(e)
+                }, room=monitor.group_id)
+                monitor.reschedule(False)
+            continue
         except Exception as e:
-            print(f"ERROR: Monitor thread error for {group_id}: {e}")
-            socketio.emit('error', {
-                'groupId': group_id,
-                'message': 'Monitoring error',
-                'error': str(e)
-            }, room=group_id)
-            break
-
-    # Cleanup
-    if group_id in active_monitors:
+            print(f"ERROR: Monitor scheduler poll failed: {e}")
+            for monitor in due:
+                socket_emit('error', {
+                    'groupId': monitor.group_id,
+                    'message': 'Monitoring error',
+                    'error': str(e)
+                }, room=monitor.group_id)
+            stop_monitors([m.group_id for m in due])
+            continue
+
+        finished = []
+        for monitor in due:
+            snapshot = snapshots.get(monitor.group_id)
+            # A capped error batch counts as movement so the rest follows soon
+            moved = bool(snapshot) and (snapshot[0] != monitor.watermark or monitor.errors_pending)
+            if snapshot:
+                monitor.watermark = snapshot[0]
+            if monitor.group_id in new_errors:
+                publish_new_errors(monitor, new_errors[monitor.group_id])
+            if publish_group_status(monitor, snapshot[1] if snapshot else None):
+                monitor.reschedule(moved)
+            else:
+                finished.append(monitor.group_id)
+
+        stop_monitors(finished)
+
+def collect_new_errors(monitors, snapshots):
+    """
+    Errors appended since the last poll of each monitored group
+
+    A monitor's first poll only records the current high-water mark - older
+    errors are available from /api/errors. Afterwards SLTKERR is read only
+    for groups whose error count went up, starting above the mark. A group
+    that got a full ERROR_EVENT_MAX_ERRORS batch keeps its old error count,
+    so the next poll reads on from the advanced mark.
+    """
+    unmarked = []
+    grown = {}
+    for monitor in monitors:
+        snapshot = snapshots.get(monitor.group_id)
+        if not snapshot:
+            continue
+        errors = snapshot[1]['progress']['errors']
+        if monitor.error_seq is None:
+            if errors:
+                unmarked.append(monitor)
+            else:
+                monitor.error_seq = 0
+            monitor.error_count = errors
+        elif errors > monitor.error_count:
+            grown[monitor.group_id] = monitor.error_seq
+
+    if unmarked:
+        marks = get_error_marks([m.group_id for m in unmarked])
+        for monitor in unmarked:
+            monitor.error_seq = marks[monitor.group_id]
+
+    new_errors = get_new_errors(grown) if grown else {}
+    for monitor in monitors:
+        monitor.errors_pending = False
+        if monitor.group_id in grown:
+            errors = new_errors.get(monitor.group_id)
+            if errors:
+                monitor.error_seq = max(monitor.error_seq, errors[-1]['sequence'])
+            if errors and len({err['sequence'] for err in errors}) >= ERROR_EVENT_MAX_ERRORS:
+                monitor.errors_pending = True
+            else:
+                monitor.error_count = snapshots[monitor.group_id][1]['progress']['errors']
+    return new_errors
+
+def publish_new_errors(monitor, errors):
+    """Emit the errors appended since the last poll to the group's room"""
+    socket_emit('error-added', {
+        'groupId': monitor.group_id,
+        'errors': errors,
+        'lastSequence': monitor.error_seq,
+        'more': monitor.errors_pending,
+        'timestamp': datetime.now().isoformat()
+    }, room=monitor.group_id)
+    print(f"INFO: {len(errors)} new errors emitted for {monitor.group_id}")
+
+def claim_due_monitors_locked(due, now):
+    """
+    The due monitors this worker leads (multi-worker mode)
+
+    Followers retry the group's lock every MONITOR_LEADER_RETRY seconds and
+    take over, starting with a full status-update, once the leader stops. A
+    follower whose group finished while it was following is dropped - the
+    leader's processing-complete already reached its clients.
+    """
+    led = []
+    for monitor in due:
+        if monitor.leader:
+            led.append(monitor)
+            continue
+        if not monitor_leadership.acquire(monitor.group_id):
+            monitor.follow()
+            monitor.next_poll = now + MONITOR_LEADER_RETRY
+            continue
+
+        stored = monitor_leadership.load(monitor.group_id)
+        if (stored and stored['status']['status'] in FINISHED_STATUSES and
+                stored['savedAt'] >= monitor.created_at):
+            del active_monitors[monitor.group_id]
+            monitor_leadership.release(monitor.group_id)
+            print(f"INFO: Group {monitor.group_id} finished under another worker - stopped following")
+            continue
+
+        if stored and stored.get('errorSeq') is not None:
+            # Continue the previous leader's error-added stream where it stopped
+            monitor.error_seq = stored['errorSeq']
+            monitor.error_count = stored['status']['progress']['errors']
+        monitor.leader = True
+        print(f"INFO: Leading monitoring for group {monitor.group_id} (worker {os.getpid()})")
+        led.append(monitor)
+    return led
+
+def status_delta(previous, current):
+    """Fields of current that differ from previous (progress compared per counter)"""
+    delta = {}
+    for key, value in current.items():
+        if key in ('groupId', 'timestamp'):
+            continue
+        if key == 'progress':
+            changed = {k: v for k, v in value.items() if previous['progress'].get(k) != v}
+            if changed:
+                delta['progress'] = changed
+        elif previous.get(key) != value:
+            delta[key] = value
+
+    if delta:
+        delta['groupId'] = current['groupId']
+        delta['timestamp'] = current['timestamp']
+    return delta
+
+def publish_group_status(monitor, status):
+    """Emit a polled status to the group's room; returns False when monitoring should stop"""
+    group_id = monitor.group_id
+
+    if not status:
+        socket_emit('error', {
+            'groupId': group_id,
+            'message': 'Group not found'
+        }, room=group_id)
+        return False
+
+    last_status = monitor.last_status
+
+    # First poll sends the full snapshot, later polls only changed fields
+    if not last_status or not STATUS_DELTA_UPDATES:
+        status_changed = (
+            not last_status or
+            last_status['status'] != status['status'] or
+            last_status['progress']['percentage'] != status['progress']['percentage']
+        )
+        if status_changed:
+            socket_emit('status-update', status, room=group_id)
+            print(f"INFO: Status update emitted for {group_id}: {status['statusText']} - {status['progress']['percentage']}%")
+    else:
+        delta = status_delta(last_status, status)
+        if delta:
+            socket_emit('status-delta', delta, room=group_id)
+            print(f"INFO: Status delta emitted for {group_id}: {status['statusText']} - {status['progress']['percentage']}%")
+
+    monitor.last_status = status
+
+    # Stop monitoring if complete or error
+    if status['status'] in FINISHED_STATUSES:
+        print(f"INFO: Group {group_id} finished with status {status['status']}")
+        socket_emit('processing-complete', status, room=group_id)
+        return False
+
+    return True
+
+def evict_idle_monitors_locked(now):
+    """Remove monitors whose last subscriber left more than MONITOR_IDLE_GRACE ago"""
+    for group_id in [g for g, m in active_monitors.items()
+                     if not m.subscribers and m.idle_since + MONITOR_IDLE_GRACE <= now]:
         del active_monitors[group_id]
-    print(f"INFO: Stopped monitoring group {group_id}")
+        if monitor_leadership is not None:
+            monitor_leadership.release(group_id)
+        print(f"INFO: Stopped monitoring group {group_id} - no subscribers")
+
+def unsubscribe_monitor(sid, group_id):
+    """
+    Drop one subscriber from a group's monitor; it goes idle when none are left
+
+    In multi-worker mode an idle monitor gives up leadership at once, so
+    followers on other workers do not wait out MONITOR_IDLE_GRACE.
+    """
+    with monitors_lock:
+        client_monitors.get(sid, set()).discard(group_id)
+        monitor = active_monitors.get(group_id)
+        if monitor is None or sid not in monitor.subscribers:
+            return
+        monitor.subscribers.discard(sid)
+        if not monitor.subscribers:
+            monitor.idle_since = time.monotonic()
+            if monitor_leadership is not None and monitor.leader:
+                # Let a worker whose clients still watch the group take over now
+                monitor_leadership.release(group_id)
+                monitor.follow()
+            monitor_wakeup.set()
+            print(f"INFO: Group {group_id} has no subscribers - stopping in {MONITOR_IDLE_GRACE}s unless watched again")
+
+def stop_monitors(group_ids):
+    """Remove groups from the shared monitor schedule"""
+    with monitors_lock:
+        for group_id in group_ids:
+            if active_monitors.pop(group_id, None) is not None:
+                if monitor_leadership is not None:
+                    monitor_leadership.release(group_id)
+                print(f"INFO: Stopped monitoring group {group_id}")
 
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
     print(f"INFO: Client connected: {request.sid}")
-    emit('connected', {'message': 'Connected to SLTK Monitor'})
+    connected_clients.add(request.sid)
+    socket_emit('connected', {'message': 'Connected to SLTK Monitor'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
     print(f"INFO: Client disconnected: {request.sid}")
+    connected_clients.discard(request.sid)
+
+    with monitors_lock:
+        group_ids = client_monitors.pop(request.sid, set())
+    for group_id in group_ids:
+        unsubscribe_monitor(request.sid, group_id)
+
+def split_by_capacity(group_ids):
+    """Groups that fit under MAX_ACTIVE_MONITORS (monitored ones always do) and the refused rest"""
+    accepted, refused = [], []
+    with monitors_lock:
+        free = MAX_ACTIVE_MONITORS - len(active_monitors)
+        for group_id in group_ids:
+            if group_id in active_monitors:
+                accepted.append(group_id)
+            elif free > 0:
+                accepted.append(group_id)
+                free -= 1
+            else:
+                refused.append(group_id)
+    return accepted, refused
+
+def initial_statuses(group_ids):
+    """
+    Statuses to send new subscribers of group_ids
+
+    The last snapshot of a monitor this worker leads (in multi-worker mode
+    otherwise the one stored by the group's leader) comes first - it is the
+    base its status-delta events apply to. The other groups are read
+    through the status cache in one batch.
+    """
+    statuses = {}
+    with monitors_lock:
+        for group_id in group_ids:
+            monitor = active_monitors.get(group_id)
+            if monitor and monitor.leader and monitor.last_status:
+                statuses[group_id] = monitor.last_status
+    if monitor_leadership is not None:
+        for group_id in group_ids:
+            if group_id not in statuses and monitor_leadership.led_elsewhere(group_id):
+                stored = monitor_leadership.load(group_id)
+                if stored:
+                    statuses[group_id] = stored['status']
+    missing = [g for g in group_ids if g not in statuses]
+    if missing:
+        statuses.update(get_cached_group_statuses(missing))
+    return statuses
+
+def subscribe_monitors(sid, group_ids):
+    """Add sid to the monitors of group_ids, scheduling the ones not running yet"""
+    if not group_ids:
+        return
+
+    with monitors_lock:
+        for group_id in group_ids:
+            monitor = active_monitors.get(group_id)
+            if monitor is None:
+                monitor = active_monitors[group_id] = GroupMonitor(group_id)
+                print(f"INFO: Scheduled monitoring for group {group_id}")
+            else:
+                print(f"INFO: Already monitoring group {group_id}")
+                if not monitor.leader:
+                    # Gave up leadership while idle - try to take it back now
+                    monitor.next_poll = min(monitor.next_poll, time.monotonic())
+            monitor.subscribers.add(sid)
+            monitor.idle_since = None
+            client_monitors.setdefault(sid, set()).add(group_id)
+
+    if monitor_leadership is not None:
+        monitor_leadership.prune()
+    ensure_monitor_scheduler()
 
 @socketio.on('monitor')
 def handle_monitor(group_id):
     """Start monitoring a SLTK group"""
+    group_id = str(group_id).strip()
     print(f"INFO: Client {request.sid} requested monitoring for group {group_id}")
 
+    if not split_by_capacity([group_id])[0]:
+        print(f"WARNING: Monitor limit reached ({MAX_ACTIVE_MONITORS}) - refusing group {group_id}")
+        socket_emit('error', {
+            'groupId': group_id,
+            'message': f'Too many groups are being monitored (limit {MAX_ACTIVE_MONITORS}) - try again later'
+        })
+        return
+
     # Join room for this group
     join_room(group_id)
 
     # Send initial status
     try:
-        status = get_group_status(group_id)
+        status = initial_statuses([group_id]).get(group_id)
         if status:
-            emit('status-update', status)
+            socket_emit('status-update', status)
         else:
-            emit('error', {'message': f'Group {group_id} not found'})
+            socket_emit('error', {'message': f'Group {group_id} not found'})
             return
     except Exception as e:
-        emit('error', {'message': f'Error getting status: {str(e)}'})
+        socket_emit('error', {'message': f'Error getting status: {str(e)}'})
         return
 
-    # Start monitoring thread if not already running
-    if group_id not in active_monitors:
-        monitor_thread = threading.Thread(target=monitor_group, args=(group_id,), daemon=True)
-        active_monitors[group_id] = monitor_thread
-        monitor_thread.start()
-        print(f"INFO: Started monitoring thread for group {group_id}")
-    else:
-        print(f"INFO: Already monitoring group {group_id}")
+    # Add group to the shared monitor schedule if not already there
+    subscribe_monitors(request.sid, [group_id])
+
+@socketio.on('monitor-many')
+def handle_monitor_many(group_ids):
+    """Start monitoring several SLTK groups (list or comma-separated string)"""
+    group_ids = parse_group_ids(group_ids)
+    print(f"INFO: Client {request.sid} requested monitoring for {len(group_ids)} groups")
+
+    if not group_ids or len(group_ids) > STATUS_BATCH_MAX_GROUPS:
+        socket_emit('error', {'message': f'monitor-many needs 1 to {STATUS_BATCH_MAX_GROUPS} group IDs'})
+        return
+
+    group_ids, refused = split_by_capacity(group_ids)
+    if refused:
+        print(f"WARNING: Monitor limit reached ({MAX_ACTIVE_MONITORS}) - refusing {len(refused)} groups")
+        socket_emit('error', {
+            'groupIds': refused,
+            'message': f'Too many groups are being monitored (limit {MAX_ACTIVE_MONITORS}) - try again later'
+        })
+
+    for group_id in group_ids:
+        join_room(group_id)
+
+    # Initial statuses for all groups with one batch of queries
+    try:
+        statuses = initial_statuses(group_ids)
+    except Exception as e:
+        socket_emit('error', {'message': f'Error getting status: {str(e)}'})
+        return
+
+    for group_id in group_ids:
+        if group_id in statuses:
+            socket_emit('status-update', statuses[group_id])
+
+    not_found = [g for g in group_ids if g not in statuses]
+    if not_found:
+        for group_id in not_found:
+            leave_room(group_id)
+        socket_emit('error', {
+            'groupIds': not_found,
+            'message': f"Groups not found: {', '.join(not_found)}"
+        })
+
+    subscribe_monitors(request.sid, [g for g in group_ids if g in statuses])
 
 @socketio.on('stop-monitor')
 def handle_stop_monitor(group_id):
     """Stop monitoring a SLTK group"""
+    group_id = str(group_id).strip()
     print(f"INFO: Client {request.sid} stopped monitoring group {group_id}")
     leave_room(group_id)
+    unsubscribe_monitor(request.sid, group_id)
+
+@socketio.on('watch-upload')
+def handle_watch_upload(job_id):
+    """Subscribe to state changes of an upload job"""
+    join_room(upload_room(job_id))
+
+    payload = find_upload_job(str(job_id))
+
+    if payload:
+        socket_emit('upload-status', payload)
+    else:
+        socket_emit('error', {'message': f'Upload job {job_id} not found'})
 
 # --- Start the Server ---
-if __name__ == '__main__':
+def print_banner(debug=False):
     print(f"\n{'='*60}")
     print(f"  SLTK Upload Chatbot - Flask API")
     print(f"{'='*60}")
@@ -694,17 +4282,29 @@ if __name__ == '__main__':
     print(f"  Dropbox Root: {DROPBOX_ROOT}")
     print(f"  POC Folder: {DROPBOX_FOLDER_POC}")
     print(f"  SLTK Library: {SLTK_LIBRARY}")
+    print(f"  Server Mode: {ASYNC_MODE}{' (debug)' if debug else ''}, {WORKERS} worker process(es)")
     print(f"{'='*60}\n")
     print(f"  Endpoints:")
     print(f"    Health check:  http://localhost:{PORT}/")
+    print(f"    Metrics:       GET  http://localhost:{PORT}/metrics")
     print(f"    Get Loads:     GET  http://localhost:{PORT}/api/loads")
+    print(f"    Refresh Loads: POST http://localhost:{PORT}/api/loads/refresh")
+    print(f"    Backlog:       GET  http://localhost:{PORT}/api/dropbox/backlog")
     print(f"    Upload:        POST http://localhost:{PORT}/upload/excel")
+    print(f"    Chunked:       POST http://localhost:{PORT}/upload/chunked")
+    print(f"    Bulk Upload:   POST http://localhost:{PORT}/upload/bulk")
+    print(f"    Upload Job:    GET  http://localhost:{PORT}/api/uploads/<jobId>")
     print(f"    Status:        GET  http://localhost:{PORT}/api/status/<groupId>")
+    print(f"    Status Batch:  GET  http://localhost:{PORT}/api/status?ids=<groupId,...>")
     print(f"    Errors:        GET  http://localhost:{PORT}/api/errors/<groupId>")
+    print(f"    Error Summary: GET  http://localhost:{PORT}/api/errors/<groupId>/summary")
     print(f"    History:       GET  http://localhost:{PORT}/api/history")
+    print(f"    Export:        GET  http://localhost:{PORT}/api/history/export?format=csv|xlsx")
     print(f"    WebSocket:     ws://localhost:{PORT}/socket.io/")
     print(f"{'='*60}\n")
 
+def check_environment():
+    """Verify the POC folder and the database connection at startup"""
     # Test folder creation at startup
     try:
         os.makedirs(DROPBOX_FOLDER_POC, exist_ok=True)
@@ -715,8 +4315,9 @@ if __name__ == '__main__':
     # Test database connection
     if PYODBC_AVAILABLE:
         try:
-            get_db_connection()
-            print(f"✅ Database connection successful")
+            with db_pool.connection():
+                pass
+            print(f"✅ Database connection successful (pool size {DB_POOL_MAX_SIZE})")
         except Exception as e:
             print(f"⚠️  WARNING: Database connection failed: {e}")
             print(f"   Update connection string in get_db_connection()")
@@ -724,11 +4325,32 @@ if __name__ == '__main__':
         print(f"⚠️  WARNING: pyodbc not available - database features disabled")
         print(f"   Install with: yum install python313-pyodbc")
 
+def start_background_services():
+    """Start the dropbox index and the upload workers"""
+    dropbox_index.start()
+
+    if ASYNC_UPLOADS:
+        start_upload_workers()
+
+def start_server(debug=False):
+    """
+    Check the environment, start background workers and serve until stopped
+
+    Used by python app.py (threading mode, Werkzeug development server with
+    debug on) and by serve.py with one worker (gevent, debug off).
+    """
+    create_app()
+    print_banner(debug)
+    check_environment()
+    start_background_services()
+
     print(f"\n🚀 Starting server...\n")
 
     try:
-        socketio.run(app, host=HOST_IP, port=PORT, debug=True, allow_unsafe_werkzeug=True)
+        socketio.run(app, host=HOST_IP, port=PORT, debug=debug, allow_unsafe_werkzeug=True)
     except Exception as e:
         print(f"ERROR: Error starting Flask server: {e}")
         input("Press Enter to exit...")
 
+if __name__ == '__main__':
+    start_server(debug=True)
@@ -0,0 +1,542 @@
+"""
+SLTK Upload Chatbot - Offline Benchmark Suite
+
+Runs the Flask API against a local SQLite stand-in for the IBM i tables
+(SLTKGRP, SLTKTRN, SLTKERR, SLTKLOD, SLTKSNU), so performance can be measured on
+any Linux box without DB2:
+
+    python benchmark.py                                  # default scale, all scenarios
+    python benchmark.py --groups 5000 --transactions 400 --scenarios status,errors
+    python benchmark.py --monitor-clients 500 --monitor-seconds 30 --json results.json
+
+Reports throughput, latency percentiles and peak memory per scenario.
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as sltk  # noqa: E402 - path setup above
+
+SCENARIOS = ('status', 'status-batch', 'errors', 'errors-ndjson', 'history', 'loads', 'upload', 'monitor')
+
+# --- DB2 Stand-in ---
+
+FETCH_FIRST = re.compile(r'FETCH\s+FIRST\s+(\d+)\s+ROWS?\s+ONLY', re.IGNORECASE)
+
+class StandInCursor:
+    """pyodbc-style cursor over sqlite3 that accepts the DB2 SQL used by app.py"""
+
+    def __init__(self, connection):
+        self._cursor = connection.cursor()
+
+    def execute(self, sql, params=None):
+        sql = FETCH_FIRST.sub(r'LIMIT \1', sql)
+        self._cursor.execute(sql, list(params or []))
+        return self
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self._cursor.close()
+
+class StandInConnection:
+    """pyodbc-style connection: the seeded database is attached as the SLTK library"""
+
+    def __init__(self, db_path):
+        self.timeout = 0  # pyodbc query timeout attribute (not enforced by sqlite)
+        # Autocommit, so every query sees rows committed by other connections
+        self._connection = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        self._connection.execute(f"ATTACH DATABASE ? AS {sltk.SLTK_LIBRARY}", (db_path,))
+        self._connection.execute("ATTACH DATABASE ':memory:' AS SYSIBM")
+        self._connection.execute("CREATE TABLE SYSIBM.SYSDUMMY1 (IBMREQD CHAR(1))")
+        self._connection.execute("INSERT INTO SYSIBM.SYSDUMMY1 VALUES ('Y')")
+
+    def cursor(self):
+        return StandInCursor(self._connection)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+def pad(value, width):
+    """Blank-pad like a DB2 CHAR column"""
+    return str(value).ljust(width)
+
+def group_id_for(index):
+    return f"G{index:09d}"
+
+def seed_database(db_path, groups, transactions, error_rate, loads, seed):
+    """Create and fill the stand-in SLTK tables"""
+    rng = random.Random(seed)
+    connection = sqlite3.connect(db_path)
+    connection.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE SLTKGRP (ZGGPID TEXT, ZGGPDS TEXT, ZGGPST TEXT, ZGCHDT INTEGER, ZGCHTM INTEGER, ZGUSER TEXT);
+        CREATE TABLE SLTKTRN (ZTGPID TEXT, ZTTKEN TEXT, ZTSEQ INTEGER, ZTSYST TEXT, ZTCHDT INTEGER, ZTCHTM INTEGER);
+        CREATE TABLE SLTKERR (ZTTKEN TEXT, ZTMSGF TEXT, ZTMSGI TEXT, ZTMSGD TEXT, ZTMSGT TEXT);
+        CREATE TABLE SLTKLOD (ZFLOAD TEXT, ZFLDTX TEXT, ZFAVST TEXT);
+        CREATE TABLE SLTKSNU (Z8LOAD TEXT, Z8WKSH TEXT);
+    """)
+
+    message_ids = ['XML0021', 'XML0141', 'XML0161', 'XML0162', 'XML9999']
+    group_statuses = ['X'] * 6 + ['E'] * 2 + ['O', 'R', 'P', 'C']
+    users = [pad(f"USER{n:02d}", 10) for n in range(25)]
+
+    for g in range(groups):
+        group_id = group_id_for(g)
+        status = rng.choice(group_statuses)
+        change_date = 20260101 + (g * 37 // max(groups, 1)) % 28
+        change_time = rng.randrange(0, 235959)
+        connection.execute(
+            "INSERT INTO SLTKGRP VALUES (?, ?, ?, ?, ?, ?)",
+            (group_id, pad(f"Benchmark load {g}", 50), status, change_date, change_time, rng.choice(users))
+        )
+
+        count = max(1, int(rng.expovariate(1 / transactions)))
+        trn_rows = []
+        err_rows = []
+        for seq in range(1, count + 1):
+            token = f"{group_id}-{seq:07d}"
+            if status == 'X':
+                trn_status = 'X'
+            elif rng.random() < error_rate:
+                trn_status = 'E'
+            else:
+                trn_status = rng.choice('XXXXOP') if status in ('O', 'E') else 'P'
+            trn_rows.append((group_id, token, seq, trn_status, change_date, seq))
+            if trn_status == 'E':
+                message_id = rng.choice(message_ids)
+                err_rows.append((token, pad('SLTKMSGF', 10), message_id,
+                                 pad(f"Row {seq}", 100), pad(f"{message_id} failure at row {seq}", 132)))
+        connection.executemany("INSERT INTO SLTKTRN VALUES (?, ?, ?, ?, ?, ?)", trn_rows)
+        connection.executemany("INSERT INTO SLTKERR VALUES (?, ?, ?, ?, ?)", err_rows)
+
+    for n in range(loads):
+        connection.execute("INSERT INTO SLTKLOD VALUES (?, ?, '0')", (pad(f"LOAD{n:04d}", 10), pad(f"Load {n}", 50)))
+        connection.execute("INSERT INTO SLTKSNU VALUES (?, ?)", (f"LOAD{n:04d}", pad('Sheet1', 30)))
+
+    # Indexes matching the access paths the app expects on IBM i
+    connection.executescript("""
+        CREATE UNIQUE INDEX SLTKGRP_ID ON SLTKGRP (ZGGPID);
+        CREATE INDEX SLTKGRP_CHG ON SLTKGRP (ZGCHDT, ZGCHTM, ZGGPID);
+        CREATE INDEX SLTKTRN_GRP ON SLTKTRN (ZTGPID, ZTSYST, ZTSEQ);
+        CREATE INDEX SLTKTRN_CHG ON SLTKTRN (ZTGPID, ZTCHDT, ZTCHTM);
+        CREATE INDEX SLTKERR_TKN ON SLTKERR (ZTTKEN);
+        ANALYZE;
+    """)
+    connection.commit()
+    # WAL lets the monitor scenario write progress while the API reads
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.close()
+
+def prepare_database(args):
+    """Reuse a seeded database for the same scale, or build one"""
+    name = f"sltk-bench-{args.groups}-{args.transactions}-{args.error_rate}-{args.seed}.db"
+    db_path = os.path.join(args.work_dir, name)
+    if os.path.exists(db_path) and not args.reseed:
+        print(f"Using seeded database {db_path}")
+        return db_path
+
+    print(f"Seeding {args.groups} groups (~{args.transactions} transactions each) into {db_path} ...")
+    started = time.perf_counter()
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    seed_database(db_path, args.groups, args.transactions, args.error_rate, args.loads, args.seed)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    return db_path
+
+def install_stand_in(db_path, work_dir):
+    """Point app.py at the stand-in database and a scratch dropbox"""
+    sltk.PYODBC_AVAILABLE = True
+    sltk.get_db_connection = lambda: StandInConnection(db_path)
+
+    dropbox_root = os.path.join(work_dir, 'dropbox')
+    shutil.rmtree(dropbox_root, ignore_errors=True)
+    os.makedirs(os.path.join(dropbox_root, 'LOAD0000'))
+    sltk.DROPBOX_ROOT = dropbox_root
+    sltk.DROPBOX_FOLDER_POC = os.path.join(work_dir, 'poc')
+    sltk.dropbox_index.root = dropbox_root
+    sltk.UPLOAD_STAGING_DIR = os.path.join(work_dir, 'staging')
+    sltk.UPLOAD_HASH_INDEX_DIR = os.path.join(work_dir, 'upload_hashes')
+    sltk.create_app()
+
+# --- Measurement ---
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+class Measurement:
+    """Latency samples plus wall time and memory for one scenario"""
+
+    def __init__(self, name, trace_memory):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.latencies = []
+        self.errors = 0
+        self.extra = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._started
+        self.heap_peak = None
+        if self.trace_memory:
+            self.heap_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.latencies.append(seconds)
+            if not ok:
+                self.errors += 1
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        result = {
+            'scenario': self.name,
+            'operations': len(latencies),
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 3),
+            'throughput': round(len(latencies) / self.elapsed, 1) if self.elapsed else 0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round((latencies[-1] if latencies else 0) * 1000, 2),
+            'max_rss_mb': round(self.max_rss / 1024 ** 2, 1),
+        }
+        if self.heap_peak is not None:
+            result['heap_peak_mb'] = round(self.heap_peak / 1024 ** 2, 1)
+        result.update(self.extra)
+        return result
+
+def run_concurrently(measurement, operation, total, concurrency):
+    """Call operation(client, n) total times spread over concurrency threads"""
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+
+    def worker():
+        client = sltk.app.test_client()
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            started = time.perf_counter()
+            try:
+                ok = operation(client, n)
+            except Exception as e:
+                print(f"  operation failed: {e}")
+                ok = False
+            measurement.record(time.perf_counter() - started, ok)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+# --- Scenarios ---
+
+def scenario_http(name, path_for, args, check=None):
+    """Generic GET scenario"""
+    def operation(client, n):
+        response = client.get(path_for(n))
+        if check:
+            return check(response)
+        return response.status_code in (200, 304)
+
+    with Measurement(name, args.trace_memory) as measurement:
+        run_concurrently(measurement, operation, args.requests, args.concurrency)
+    return measurement
+
+def scenario_status_batch(args, rng):
+    """Operations board: status of --batch-groups random groups per request"""
+    def operation(client, n):
+        ids = ','.join(random_group(rng, args) for _ in range(args.batch_groups))
+        response = client.get(f"/api/status?ids={ids}")
+        return response.status_code == 200
+
+    queries_before = count_queries()
+    with Measurement('status-batch', args.trace_memory) as measurement:
+        run_concurrently(measurement, operation, args.requests, args.concurrency)
+    measurement.extra.update({
+        'groups_per_request': args.batch_groups,
+        'queries_per_request': round((count_queries() - queries_before) / args.requests, 2),
+    })
+    return measurement
+
+def count_queries():
+    """DB queries recorded so far (all query names)"""
+    return sum(series[-1] for series in sltk.DB_QUERY_SECONDS._series.values())
+
+def scenario_errors_ndjson(args, rng):
+    def operation(client, n):
+        response = client.get(f"/api/errors/{random_group(rng, args)}?format=ndjson")
+        lines = 0
+        for chunk in response.response:
+            lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+        response.close()
+        return response.status_code == 200
+
+    with Measurement('errors-ndjson', args.trace_memory) as measurement:
+        run_concurrently(measurement, operation, args.requests, args.concurrency)
+    return measurement
+
+def scenario_history(args):
+    """Walk several keyset pages per operation"""
+    def operation(client, n):
+        cursor = None
+        for _ in range(args.history_pages):
+            url = f"/api/history?limit={args.page_size}" + (f"&cursor={cursor}" if cursor else '')
+            response = client.get(url)
+            if response.status_code != 200:
+                return False
+            cursor = response.get_json()['data'].get('next')
+            if not cursor:
+                break
+        return True
+
+    with Measurement('history', args.trace_memory) as measurement:
+        run_concurrently(measurement, operation, args.requests, args.concurrency)
+    measurement.extra['pages_per_op'] = args.history_pages
+    return measurement
+
+def build_workbook(rows, columns):
+    """Synthetic load spreadsheet as bytes"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append([f"COL{c}" for c in range(columns)])
+    for r in range(rows):
+        sheet.append([f"R{r}C{c}" if c % 2 else r * columns + c for c in range(columns)])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def scenario_upload(args):
+    """POST synthetic workbooks to /upload/excel and wait until each is dropped"""
+    if not sltk.OPENPYXL_AVAILABLE:
+        print("  skipped: openpyxl is not installed")
+        return None
+
+    workbook = build_workbook(args.upload_rows, args.upload_columns)
+    sltk.ASYNC_UPLOADS = args.async_uploads
+
+    def operation(client, n):
+        response = client.post('/upload/excel', data={
+            'excel_file': (io.BytesIO(workbook), f"LOAD0000_bench_{n}.xlsx"),
+            'load_id': 'LOAD0000',
+            'force': 'true'  # The same workbook every time - bypass deduplication
+        }, content_type='multipart/form-data')
+        if response.status_code == 200:
+            return True
+        if response.status_code != 202:
+            return False
+        job_id = response.get_json()['job_id']
+        while True:
+            state = client.get(f"/api/uploads/{job_id}").get_json()['data']['state']
+            if state in ('dropped', 'failed'):
+                return state == 'dropped'
+            time.sleep(0.01)
+
+    with Measurement('upload', args.trace_memory) as measurement:
+        run_concurrently(measurement, operation, args.uploads, args.upload_concurrency)
+    measurement.extra['workbook_kb'] = round(len(workbook) / 1024, 1)
+    measurement.extra['rows'] = args.upload_rows
+    return measurement
+
+def scenario_monitor(args, db_path, rng):
+    """Many Socket.IO clients monitoring groups while transactions progress"""
+    active_groups = [group_id_for(rng.randrange(args.groups)) for _ in range(args.monitor_groups)]
+    stop = threading.Event()
+
+    # Watched groups are in processing while the scenario runs
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute(
+        f"UPDATE SLTKGRP SET ZGGPST = 'O' WHERE ZGGPID IN ({', '.join('?' for _ in active_groups)})",
+        active_groups
+    )
+    connection.commit()
+    connection.close()
+    sltk.status_cache.invalidate()
+
+    def progress_writer():
+        # Simulate SLTKDRP working through transactions of the watched groups
+        connection = sqlite3.connect(db_path, timeout=30)
+        while not stop.is_set():
+            group_id = rng.choice(active_groups)
+            now = time.localtime()
+            connection.execute(
+                "UPDATE SLTKTRN SET ZTSYST = 'X', ZTCHDT = ?, ZTCHTM = ? WHERE rowid IN "
+                "(SELECT rowid FROM SLTKTRN WHERE ZTGPID = ? AND ZTSYST IN ('P', 'O') LIMIT 5)",
+                (int(time.strftime('%Y%m%d', now)), int(time.strftime('%H%M%S', now)), group_id)
+            )
+            connection.commit()
+            time.sleep(args.monitor_write_interval)
+        connection.close()
+
+    with Measurement('monitor', args.trace_memory) as measurement:
+        clients = []
+        for n in range(args.monitor_clients):
+            client = sltk.socketio.test_client(sltk.app)
+            started = time.perf_counter()
+            client.emit('monitor', active_groups[n % len(active_groups)])
+            measurement.record(time.perf_counter() - started, client.is_connected())
+            clients.append(client)
+
+        writer = threading.Thread(target=progress_writer, daemon=True)
+        writer.start()
+        time.sleep(args.monitor_seconds)
+        stop.set()
+        writer.join()
+
+        received = {}
+        for client in clients:
+            for message in client.get_received():
+                received[message['name']] = received.get(message['name'], 0) + 1
+            client.disconnect()
+
+    polls = sum(series[-1] for labels, series in sltk.DB_QUERY_SECONDS._series.items()
+                if labels == ('group_status',))
+    measurement.extra.update({
+        'clients': args.monitor_clients,
+        'groups': len(set(active_groups)),
+        'events_received': sum(received.values()),
+        'events_per_second': round(sum(received.values()) / args.monitor_seconds, 1),
+        'events_by_name': received,
+        'threads': threading.active_count(),
+        'group_status_queries': polls,
+    })
+    return measurement
+
+def random_group(rng, args):
+    return group_id_for(rng.randrange(args.groups))
+
+def run(args):
+    os.makedirs(args.work_dir, exist_ok=True)
+    db_path = prepare_database(args)
+    install_stand_in(db_path, args.work_dir)
+    rng = random.Random(args.seed)
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+
+    if args.no_status_cache:
+        sltk.status_cache.ttl = sltk.status_cache.finished_ttl = 0
+
+    results = []
+    for name in scenarios:
+        print(f"\n▶ {name}")
+        if name == 'status':
+            measurement = scenario_http('status', lambda n: f"/api/status/{random_group(rng, args)}", args,
+                                        check=lambda r: r.status_code in (200, 404))
+        elif name == 'status-batch':
+            measurement = scenario_status_batch(args, rng)
+        elif name == 'errors':
+            measurement = scenario_http('errors', lambda n: f"/api/errors/{random_group(rng, args)}?limit={args.page_size}", args)
+        elif name == 'errors-ndjson':
+            measurement = scenario_errors_ndjson(args, rng)
+        elif name == 'history':
+            measurement = scenario_history(args)
+        elif name == 'loads':
+            measurement = scenario_http('loads', lambda n: "/api/loads", args)
+        elif name == 'upload':
+            measurement = scenario_upload(args)
+        else:
+            measurement = scenario_monitor(args, db_path, rng)
+
+        if measurement is None:
+            continue
+        summary = measurement.summary()
+        results.append(summary)
+        print('  ' + ', '.join(f"{k}={v}" for k, v in summary.items() if k != 'scenario'))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return results
+
+def print_table(results):
+    columns = ['scenario', 'operations', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'max_rss_mb']
+    print(f"\n{'='*100}")
+    print('  '.join(f"{c:>12}" for c in columns))
+    for result in results:
+        print('  '.join(f"{str(result.get(c, '')):>12}" for c in columns))
+    print(f"{'='*100}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the SLTK Flask API")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--groups', type=int, default=2000, help="SLTKGRP rows to generate")
+    parser.add_argument('--transactions', type=int, default=250, help="Mean SLTKTRN rows per group")
+    parser.add_argument('--error-rate', type=float, default=0.05, help="Share of failed transactions in active groups")
+    parser.add_argument('--loads', type=int, default=200, help="SLTKLOD rows to generate")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reseed', action='store_true', help="Rebuild the stand-in database even if cached")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'sltk-bench'))
+    parser.add_argument('--requests', type=int, default=500, help="Operations per HTTP scenario")
+    parser.add_argument('--concurrency', type=int, default=8, help="Client threads per HTTP scenario")
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--batch-groups', type=int, default=100, help="Groups per status-batch request")
+    parser.add_argument('--history-pages', type=int, default=5)
+    parser.add_argument('--no-status-cache', action='store_true', help="Disable the status cache TTLs")
+    parser.add_argument('--uploads', type=int, default=10)
+    parser.add_argument('--upload-concurrency', type=int, default=2)
+    parser.add_argument('--upload-rows', type=int, default=20000)
+    parser.add_argument('--upload-columns', type=int, default=12)
+    parser.add_argument('--async-uploads', action='store_true', help="Use the upload job queue (202 + polling)")
+    parser.add_argument('--monitor-clients', type=int, default=200)
+    parser.add_argument('--monitor-groups', type=int, default=100)
+    parser.add_argument('--monitor-seconds', type=float, default=10)
+    parser.add_argument('--monitor-write-interval', type=float, default=0.05)
+    parser.add_argument('--trace-memory', action='store_true', help="Report Python heap peak per scenario (slower)")
+    parser.add_argument('--json', help="Write results to this JSON file")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    run(parse_args())
@@ -0,0 +1,162 @@
+"""
+SLTK Upload Chatbot - Production entry point (Runs on IBM i)
+
+Serves the Flask API and Socket.IO on gevent instead of the Werkzeug
+development server, so thousands of dashboard connections share one process
+as greenlets instead of costing an OS thread each. pyodbc calls run on a
+bounded native thread pool (see run_blocking in app.py) so a slow query
+never stalls the event loop.
+
+With SLTK_WORKERS > 1 this process becomes a supervisor: it opens the
+listening socket, runs a small local message broker and starts that many
+worker processes sharing the socket. Workers relay Socket.IO events through
+the broker (a Unix socket in the private SHARED_STATE_DIR) and elect one
+leader per monitored group, so every group is polled once no matter how
+many workers run. Workers that exit are restarted.
+
+Usage:
+    python serve.py                   # one process
+    SLTK_WORKERS=4 python serve.py    # supervisor + 4 workers
+"""
+
+import os
+import sys
+import signal
+import subprocess
+
+os.environ['SLTK_ASYNC_MODE'] = 'gevent'
+WORKERS = int(os.environ.setdefault('SLTK_WORKERS', '1'))
+LISTEN_FD = os.environ.get('SLTK_LISTEN_FD')  # Set for worker processes
+
+# Monkey patching has to happen before anything imports socket/threading
+from gevent import monkey  # noqa: E402
+monkey.patch_all()
+
+import gevent  # noqa: E402
+from gevent import pywsgi, socket  # noqa: E402
+from gevent.event import Event  # noqa: E402
+from gevent.queue import Queue  # noqa: E402
+from gevent.server import StreamServer  # noqa: E402
+
+import app  # noqa: E402 - must follow monkey patching
+
+def message_queue_url():
+    return f"sltk://{app.MESSAGE_BROKER_SOCKET}"
+
+# --- Message Broker (supervisor) ---
+
+def start_broker():
+    """
+    Relay JSON lines between worker processes
+
+    A connection that starts with 'SUB' receives every line published
+    afterwards; any other connection publishes its lines. Each subscriber
+    has its own queue so one slow worker never holds up the rest.
+
+    The broker listens on a Unix socket with mode 0600 inside the 0700
+    SHARED_STATE_DIR, so only processes of the service user can publish.
+    """
+    subscribers = set()
+
+    def handle(sock, address):
+        reader = sock.makefile('rb')
+        line = reader.readline()
+        if line == b'SUB\n':
+            outbox = Queue()
+            subscribers.add(outbox)
+            sender = gevent.spawn(forward, sock, outbox)
+            try:
+                reader.read()  # Returns when the worker disconnects
+            finally:
+                subscribers.discard(outbox)
+                sender.kill()
+            return
+
+        while line:
+            for outbox in list(subscribers):
+                outbox.put(line)
+            line = reader.readline()
+
+    def forward(sock, outbox):
+        try:
+            while True:
+                sock.sendall(outbox.get())
+        except OSError:
+            pass
+
+    path = app.MESSAGE_BROKER_SOCKET
+    app.make_private_dir(os.path.dirname(path))
+    app.remove_quietly(path)  # Left over from a previous run
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    previous_umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(path, 0o600)
+    listener.listen(128)
+    server = StreamServer(listener, handle)
+    server.start()
+    print(f"INFO: Message broker listening on {path}")
+    return server
+
+# --- Workers ---
+
+def spawn_worker(listener):
+    """Start a worker process that serves requests from the shared socket"""
+    env = dict(os.environ, SLTK_LISTEN_FD=str(listener.fileno()))
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                            env=env, pass_fds=(listener.fileno(),))
+
+def run_worker():
+    """Worker process: serve the inherited listening socket until stopped"""
+    listener = socket.socket(fileno=int(LISTEN_FD))
+    app.create_app(message_queue=message_queue_url())
+    app.check_environment()
+    app.start_background_services()
+    server = pywsgi.WSGIServer(listener, app.app, log=None)
+    gevent.signal_handler(signal.SIGTERM, server.stop)
+    gevent.signal_handler(signal.SIGINT, server.stop)
+    print(f"INFO: Worker {os.getpid()} ready")
+    server.serve_forever()
+    app.stop_upload_workers()
+
+def run_supervisor():
+    """Own the listening socket and broker, keep WORKERS workers running"""
+    app.print_banner()
+    app.make_private_dir(app.SHARED_STATE_DIR)
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((app.HOST_IP, app.PORT))
+    listener.listen(1024)
+    broker = start_broker()
+
+    workers = [spawn_worker(listener) for _ in range(WORKERS)]
+    print(f"\n🚀 Started {WORKERS} workers on port {app.PORT}\n")
+
+    stopping = Event()
+    gevent.signal_handler(signal.SIGTERM, stopping.set)
+    gevent.signal_handler(signal.SIGINT, stopping.set)
+
+    while not stopping.wait(1):
+        for i, worker in enumerate(workers):
+            if worker.poll() is not None:
+                print(f"⚠️  WARNING: Worker {worker.pid} exited with code {worker.returncode} - restarting")
+                workers[i] = spawn_worker(listener)
+
+    print("INFO: Stopping workers...")
+    for worker in workers:
+        worker.terminate()
+    for worker in workers:
+        worker.wait()
+    broker.stop()
+    app.remove_quietly(app.MESSAGE_BROKER_SOCKET)
+
+if __name__ == '__main__':
+    if LISTEN_FD:
+        run_worker()
+    elif WORKERS > 1:
+        run_supervisor()
+    else:
+        app.start_server(debug=False)
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Upload, FileSpreadsheet, CheckCircle2, AlertTriangle, Loader2, X, Clock, TrendingUp } from 'lucide-react';
 import { io, Socket } from 'socket.io-client';
 
@@ -21,6 +21,27 @@ type UploadStatus = {
   timestamp: string;
 };
 
+// Changed fields sent after the first full status-update
+type StatusDelta = Partial<Omit<UploadStatus, 'progress'>> & {
+  groupId: string;
+  progress?: Partial<UploadStatus['progress']>;
+};
+
+const applyStatusDelta = (status: UploadStatus, delta: StatusDelta): UploadStatus => ({
+  ...status,
+  ...delta,
+  progress: { ...status.progress, ...delta.progress },
+});
+
+// Background processing of an accepted upload (upload-status event)
+type UploadJob = {
+  jobId: string;
+  filename: string;
+  state: 'queued' | 'processing' | 'dropped' | 'failed';
+  error: string | null;
+  serverPath: string;
+};
+
 type ErrorDetail = {
   token: string;
   sequence: number;
@@ -42,10 +63,19 @@ export default function App() {
   const [showErrors, setShowErrors] = useState(false);
   const [socket, setSocket] = useState<Socket | null>(null);
   const [health, setHealth] = useState<string>('');
+  const watchedJob = useRef<string | null>(null);
+
+  const fileDropped = () => {
+    // For now, we'll need to manually get the group ID
+    // In production, you'd get this from SLTKDRP or query recent groups
+    setUploadMessage('ℹ️ File uploaded. Enter Group ID to monitor, or check history.');
+    setBusyUpload(false);
+  };
 
   // Initialize WebSocket connection
   useEffect(() => {
-    const newSocket = io(API_URL);
+    // WebSocket only - long-polling needs sticky sessions, which multi-worker servers don't have
+    const newSocket = io(API_URL, { transports: ['websocket'] });
     
     newSocket.on('connect', () => {
       console.log('✅ Connected to SLTK Monitor');
@@ -57,6 +87,43 @@ export default function App() {
       setUploadMessage(`${status.statusText} - ${status.progress.percentage}% complete`);
     });
 
+    newSocket.on('status-delta', (delta: StatusDelta) => {
+      console.log('📊 Status delta:', delta);
+      setCurrentStatus(prev => {
+        if (!prev || prev.groupId !== delta.groupId) return prev;
+        const status = applyStatusDelta(prev, delta);
+        setUploadMessage(`${status.statusText} - ${status.progress.percentage}% complete`);
+        return status;
+      });
+    });
+
+    // Progress of the upload accepted by /upload/excel (202 + job_id)
+    newSocket.on('upload-status', (job: UploadJob) => {
+      if (job.jobId !== watchedJob.current) return;
+      console.log('📦 Upload job:', job);
+      if (job.state === 'queued') {
+        setUploadMessage('⏳ File received - waiting for a worker to process it...');
+      } else if (job.state === 'processing') {
+        setUploadMessage('⚙️ Processing workbook...');
+      } else if (job.state === 'dropped') {
+        watchedJob.current = null;
+        setUploadMessage('✅ File uploaded! Waiting for SLTKDRP to process...');
+        // Wait a moment for SLTKDRP to create the group
+        setTimeout(fileDropped, 2000);
+      } else if (job.state === 'failed') {
+        watchedJob.current = null;
+        setUploadMessage(`❌ Upload failed: ${job.error}`);
+        setBusyUpload(false);
+      }
+    });
+
+    // Failures reported while the load is still running
+    newSocket.on('error-added', (added: { groupId: string; errors: ErrorDetail[] }) => {
+      console.log('⚠️ Errors added:', added);
+      setErrors(prev => [...prev, ...added.errors]);
+      setShowErrors(true);
+    });
+
     newSocket.on('processing-complete', async (status: UploadStatus) => {
       console.log('✅ Processing complete:', status);
       setCurrentStatus(status);
@@ -135,16 +202,20 @@ export default function App() {
       const res = await fetch(`${API_URL}/upload/excel`, { method: 'POST', body: fd });
       const data = await res.json();
 
-      if (data.status === 'success') {
+      if (data.status === 'success' && data.duplicate) {
+        // Identical file already dropped for this load - nothing new for SLTKDRP
+        setUploadMessage(`ℹ️ ${data.message}`);
+        setBusyUpload(false);
+      } else if (data.status === 'success' && data.job_id) {
+        // Accepted (202) - the workbook is processed in the background
+        setUploadMessage('⏳ File received - waiting for a worker to process it...');
+        watchedJob.current = data.job_id;
+        socket?.emit('watch-upload', data.job_id);
+      } else if (data.status === 'success') {
         setUploadMessage('✅ File uploaded! Waiting for SLTKDRP to process...');
-        
+
         // Wait a moment for SLTKDRP to create the group
-        setTimeout(async () => {
-          // For now, we'll need to manually get the group ID
-          // In production, you'd get this from SLTKDRP or query recent groups
-          setUploadMessage('ℹ️ File uploaded. Enter Group ID to monitor, or check history.');
-          setBusyUpload(false);
-        }, 2000);
+        setTimeout(fileDropped, 2000);
       } else {
         setUploadMessage(`❌ Upload failed: ${data.message}`);
         setBusyUpload(false);